@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import csv
 from pathlib import Path
 
 import pandas as pd
 
+from ingestion import SOURCE_COLUMN, load_results
+
 
 INPUT_DIR = Path("results")
 OUTPUT_DIR = Path("results")
@@ -26,21 +27,6 @@ REQUIRED_COLUMNS = {
 }
 
 
-def detect_separator(file_path: Path) -> str:
-    """Detect the CSV delimiter with a safe fallback to semicolon."""
-    with file_path.open("r", encoding="utf-8-sig", newline="") as handle:
-        sample = handle.read(4096)
-
-    if not sample:
-        return ";"
-
-    try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=";,|\t")
-        return dialect.delimiter
-    except csv.Error:
-        return ";"
-
-
 def parse_bool_like(series: pd.Series) -> pd.Series:
     """
     Convert mixed correctness values to a nullable numeric series.
@@ -48,6 +34,8 @@ def parse_bool_like(series: pd.Series) -> pd.Series:
     Supported examples include 0/1, True/False, yes/no, tak/nie.
     Unknown values stay missing instead of being silently replaced.
     """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("Float64")
     normalized = series.astype("string").str.strip().str.lower()
     mapping = {
         "1": 1.0,
@@ -68,6 +56,8 @@ def parse_bool_like(series: pd.Series) -> pd.Series:
 
 def parse_training_flag(series: pd.Series) -> pd.Series:
     """Convert practice-trial markers to a nullable numeric series."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("Float64")
     normalized = series.astype("string").str.strip().str.lower()
     mapping = {
         "1": 1.0,
@@ -86,22 +76,14 @@ def parse_training_flag(series: pd.Series) -> pd.Series:
     return normalized.map(mapping, na_action="ignore").astype("Float64")
 
 
-def read_result_file(file_path: Path) -> pd.DataFrame:
-    """Read a result CSV robustly while preserving missing values."""
-    separator = detect_separator(file_path)
-    data = pd.read_csv(
-        file_path,
-        sep=separator,
-        encoding="utf-8-sig",
-        dtype="string",
-        keep_default_na=True,
-    )
-
+def prepare_result_data(data: pd.DataFrame) -> pd.DataFrame:
+    """Validate one result file's rows from the ingestion cache and drop practice trials."""
     missing_columns = REQUIRED_COLUMNS.difference(data.columns)
     if missing_columns:
         missing = ", ".join(sorted(missing_columns))
         raise ValueError(f"Missing required columns: {missing}")
 
+    data = data.copy()
     data["czas_reakcji_ms"] = pd.to_numeric(data["czas_reakcji_ms"], errors="coerce")
     data["czy_poprawna"] = parse_bool_like(data["czy_poprawna"])
     data["czy_trening"] = parse_training_flag(data["czy_trening"])
@@ -125,9 +107,9 @@ def extract_participant_id(data: pd.DataFrame) -> str:
     return str(participant_values[0])
 
 
-def aggregate_participant_file(file_path: Path) -> pd.DataFrame:
+def aggregate_participant_data(data: pd.DataFrame) -> pd.DataFrame:
     """Aggregate one participant's file by load condition and icon category."""
-    data = read_result_file(file_path)
+    data = prepare_result_data(data)
     participant_id = extract_participant_id(data)
     valid_reaction_time = data["czas_reakcji_ms"].where(data["czas_reakcji_ms"] >= 200)
     data = data.assign(valid_reaction_time_ms=valid_reaction_time)
@@ -151,11 +133,10 @@ def aggregate_participant_file(file_path: Path) -> pd.DataFrame:
 def main() -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    result_files = sorted(
-        path for path in INPUT_DIR.iterdir() if path.is_file() and path.name.startswith("result_")
-    )
+    # Only new or changed files are parsed; the rest comes from the ingestion cache.
+    results = load_results(str(INPUT_DIR), verbose=False)
 
-    if not result_files:
+    if results.empty:
         print(f"No files starting with 'result_' were found in {INPUT_DIR.resolve()}")
         return
 
@@ -163,9 +144,10 @@ def main() -> None:
     processed_files = 0
     skipped_files: list[str] = []
 
-    for file_path in result_files:
+    # One groupby pass instead of scanning the whole archive once per file.
+    for file_name, file_data in results.groupby(SOURCE_COLUMN, sort=True):
         try:
-            participant_summary = aggregate_participant_file(file_path)
+            participant_summary = aggregate_participant_data(file_data)
             participant_id = participant_summary["participant_id"].iloc[0]
             output_file = OUTPUT_DIR / f"Averaged_results_{participant_id}.csv"
             participant_summary.to_csv(output_file, index=False, encoding="utf-8-sig")
@@ -173,7 +155,7 @@ def main() -> None:
             aggregated_frames.append(participant_summary)
             processed_files += 1
         except Exception as exc:
-            skipped_files.append(f"{file_path.name}: {exc}")
+            skipped_files.append(f"{file_name}: {exc}")
 
     if aggregated_frames:
         combined = pd.concat(aggregated_frames, ignore_index=True)
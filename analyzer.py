@@ -1,147 +1,392 @@
 import pandas as pd
 import numpy as np
 from scipy import stats
-import glob
 import os
+import argparse
+import json
+from ingestion import load_results, iter_result_chunks
 
 # ─────────────────────────────────────────
 #  WCZYTYWANIE DANYCH
 # ─────────────────────────────────────────
 
-def load_data(pattern='data/result_*.csv'):
-    files = glob.glob(pattern)
-    if not files:
+def load_data(pattern='data/result_*.csv', workers=None):
+    # parsowane sa tylko nowe/zmienione pliki (rownolegle, workers procesow),
+    # reszta z cache (ingestion.py)
+    df = load_results(os.path.dirname(pattern) or '.', os.path.basename(pattern), workers=workers)
+    if df.empty:
         raise FileNotFoundError(f'Brak plikow pasujacych do: {pattern}')
-    df = pd.concat([pd.read_csv(f, sep=';') for f in files], ignore_index=True)
     print(f'Wczytano {len(df)} prob od {df["id_badanego"].nunique()} badanych')
     return df
 
+RT_MIN, RT_MAX = 200, 2000
+
 def preprocess(df):
     # tylko glowne proby (nie trening)
     df = df[df['czy_trening'] == 0].copy()
     # tylko poprawne odpowiedzi do analizy RT
     df_correct = df[df['czy_poprawna'] == 1].copy()
     # usun outliery RT (< 200ms lub > 2000ms)
-    df_correct = df_correct[(df_correct['czas_reakcji_ms'] >= 200) &
-                            (df_correct['czas_reakcji_ms'] <= 2000)]
+    df_correct = df_correct[(df_correct['czas_reakcji_ms'] >= RT_MIN) &
+                            (df_correct['czas_reakcji_ms'] <= RT_MAX)]
     return df, df_correct
 
 # ─────────────────────────────────────────
 #  STATYSTYKI OPISOWE
 # ─────────────────────────────────────────
 
-def descriptive_stats(df_correct, df_all):
+DEFAULT_KEYS = ['load_condition', 'icon_category']
+
+def condition_stats(df_correct, df_all, keys=DEFAULT_KEYS):
+    """Jeden przebieg groupby z wbudowanymi agregacjami: RT poprawnych prob
+    (z df_correct) i dokladnosc (z df_all). Bez zaokraglen."""
+    rt = df_all['czas_reakcji_ms'].where(df_all.index.isin(df_correct.index))
+    grouped = df_all[list(keys) + ['czy_poprawna']].assign(rt=rt).groupby(list(keys), observed=True).agg(
+        n=('rt', 'count'),
+        mean=('rt', 'mean'),
+        median=('rt', 'median'),
+        sd=('rt', 'std'),
+        min=('rt', 'min'),
+        max=('rt', 'max'),
+        n_all=('czy_poprawna', 'size'),
+        accuracy=('czy_poprawna', 'mean'),
+    )
+    rt_table = grouped[['n', 'mean', 'median', 'sd', 'min', 'max']]
+    rt_table = rt_table[rt_table['n'] > 0]
+    acc_table = grouped[['n_all', 'accuracy']].rename(columns={'n_all': 'n'})
+    acc_table = acc_table.assign(accuracy=acc_table['accuracy'] * 100)
+    return rt_table, acc_table
+
+def stats_to_json(rt, acc, path):
+    """Tabele statystyk jako JSON (lista rekordow na tabele)."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'czas_reakcji_ms': rt.reset_index().to_dict(orient='records'),
+            'dokladnosc_proc': acc.reset_index().to_dict(orient='records'),
+        }, f, ensure_ascii=False, indent=2, default=str)
+    print(f'\nStatystyki zapisane: {path}')
+
+def descriptive_stats(df_correct, df_all, keys=DEFAULT_KEYS):
+    rt, acc = condition_stats(df_correct, df_all, keys)
+    print_descriptive(rt, acc)
+    return rt, acc
+
+def print_descriptive(rt, acc):
     print('\n' + '='*60)
     print('STATYSTYKI OPISOWE')
     print('='*60)
 
-    # RT per warunek
-    rt = df_correct.groupby(['load_condition', 'icon_category'])['czas_reakcji_ms'].agg(
-        n='count',
-        mean=lambda x: round(x.mean(), 1),
-        median=lambda x: round(x.median(), 1),
-        sd=lambda x: round(x.std(), 1),
-        min='min',
-        max='max'
-    )
     print('\nCzas reakcji (ms) — poprawne proby:')
-    print(rt.to_string())
+    print(rt.round({'mean': 1, 'median': 1, 'sd': 1}).to_string())
 
-    # Accuracy per warunek
-    acc = df_all.groupby(['load_condition', 'icon_category'])['czy_poprawna'].agg(
-        n='count',
-        accuracy=lambda x: round(x.mean() * 100, 1)
-    )
     print('\nDokladnosc (% poprawnych):')
-    print(acc.to_string())
-
-    return rt, acc
+    print(acc.round({'accuracy': 1}).to_string())
 
 # ─────────────────────────────────────────
 #  TESTY STATYSTYCZNE
 # ─────────────────────────────────────────
 
-def mann_whitney(a, b, label_a, label_b, measure='RT'):
-    u, p = stats.mannwhitneyu(a, b, alternative='two-sided')
-    med_a, med_b = np.median(a), np.median(b)
-    r = u / (len(a) * len(b))  # effect size r
-    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else 'ns'
-    print(f'  {label_a} vs {label_b}: U={u:.0f}, p={p:.4f} {sig} | '
-          f'med={med_a:.1f} vs {med_b:.1f} | r={r:.3f}')
+# Silnik rangowy: kolumna RT sortowana raz dla calego podzialu na warunki,
+# a z jednego sortowania liczone sa wszystkie kontrasty Manna-Whitneya
+# (U, poprawka na rangi wiazane, r) i H Kruskala-Wallisa. Po sortowaniu
+# dane to tylko macierz liczebnosci: wiersz = rozna wartosc RT, kolumna =
+# komorka (np. LL+neutral). Strona kontrastu moze obejmowac kilka komorek
+# ('LL' = LL+neutral i LL+social), jej liczebnosci to suma kolumn.
+
+class RankEngine:
+    """Rangi RT wspolne dla wszystkich testow na komorkach keys (np. load x kategoria)."""
+    def __init__(self, df, keys=('load_condition', 'icon_category'), value='czas_reakcji_ms'):
+        df = df[df[value].notna()]
+        grouped = df.groupby(list(keys), sort=True, observed=True, dropna=False)
+        codes = grouped.ngroup().to_numpy()
+        cells = grouped.size().index
+        self.cells = ['+'.join(map(str, c if isinstance(c, tuple) else (c,))) for c in cells]
+        k = len(self.cells)
+
+        values = df[value].to_numpy(dtype=float)
+        order = np.argsort(values, kind='stable')
+        values, codes = values[order], codes[order]
+        new_run = np.r_[True, values[1:] != values[:-1]] if len(values) else np.zeros(0, bool)
+        run = np.cumsum(new_run) - 1
+        self.run_values = values[new_run]
+        self.counts = np.bincount(run * k + codes, minlength=len(self.run_values) * k) \
+                        .reshape(len(self.run_values), k)
+
+    def side(self, label):
+        """Indeksy komorek pasujacych do etykiety: 'LL+social' - jedna komorka,
+        'LL' - wszystkie komorki z LL na ktorejkolwiek pozycji."""
+        parts = set(label.split('+'))
+        idx = [i for i, cell in enumerate(self.cells) if parts <= set(cell.split('+'))]
+        if not idx:
+            raise ValueError(f'brak komorki pasujacej do {label!r} (sa: {", ".join(self.cells)})')
+        return idx
+
+    def _side_counts(self, labels):
+        sides = [self.side(label) for label in labels]
+        flat = [i for idx in sides for i in idx]
+        if len(flat) != len(set(flat)):
+            raise ValueError(f'strony kontrastu {labels} maja wspolne komorki')
+        return [self.counts[:, idx].sum(axis=1) for idx in sides]
+
+    def values(self, label):
+        return np.repeat(self.run_values, self.counts[:, self.side(label)].sum(axis=1))
+
+    def _median(self, c):
+        n = c.sum()
+        if not n:
+            return np.nan
+        cum = np.cumsum(c)
+        lo = np.searchsorted(cum, (n - 1) // 2, side='right')
+        hi = np.searchsorted(cum, n // 2, side='right')
+        return (self.run_values[lo] + self.run_values[hi]) / 2
+
+    def mann_whitney(self, a, b):
+        """Dwustronny test U jak stats.mannwhitneyu (asymptotyczny z poprawka na
+        ciaglosc i rangi wiazane); dla malych prob bez wiazan - dokladny ze scipy."""
+        ca, cb = self._side_counts([a, b])
+        n1, n2 = int(ca.sum()), int(cb.sum())
+        result = {'n1': n1, 'n2': n2, 'med_a': self._median(ca), 'med_b': self._median(cb)}
+        if not (n1 and n2):
+            return {**result, 'u': np.nan, 'p': np.nan, 'r': np.nan}
+
+        ca, cb = ca.astype(float), cb.astype(float)
+        t = ca + cb
+        u1 = np.sum(ca * (np.cumsum(cb) - cb / 2))  # pary a > b + polowa remisow
+        if not (n1 > 8 and n2 > 8) and not (t > 1).any():
+            u1, p = stats.mannwhitneyu(self.values(a), self.values(b), alternative='two-sided')
+        else:
+            n = n1 + n2
+            tie_term = np.sum(t ** 3 - t)
+            s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+            z = (max(u1, n1 * n2 - u1) - n1 * n2 / 2 - 0.5) / s
+            p = min(2 * stats.norm.sf(z), 1.0)
+        return {**result, 'u': u1, 'p': p, 'r': u1 / (n1 * n2)}
+
+    def contrasts(self, pairs):
+        """Lista wynikow mann_whitney dla listy par etykiet - bez ponownego sortowania."""
+        return [self.mann_whitney(a, b) for a, b in pairs]
+
+    def kruskal(self, labels):
+        """H Kruskala-Wallisa (z poprawka na rangi wiazane) dla rozlacznych grup labels."""
+        c = np.column_stack(self._side_counts(labels)).astype(float)
+        t = c.sum(axis=1)
+        mid_rank = np.cumsum(t) - (t - 1) / 2
+        n = c.sum(axis=0)
+        N = n.sum()
+        if len(labels) < 2 or (n == 0).any() or N < 2:
+            return np.nan, np.nan
+        h = 12 / (N * (N + 1)) * np.sum((mid_rank @ c) ** 2 / n) - 3 * (N + 1)
+        h /= 1 - np.sum(t ** 3 - t) / (N ** 3 - N)
+        return h, stats.chi2.sf(h, len(labels) - 1)
+
+def significance(p):
+    return '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else 'ns'
+
+def print_mann_whitney(res, label_a, label_b):
+    print(f'  {label_a} vs {label_b}: U={res["u"]:.0f}, p={res["p"]:.4f} {significance(res["p"])} | '
+          f'med={res["med_a"]:.1f} vs {res["med_b"]:.1f} | r={res["r"]:.3f}')
 
 def wilcoxon_test(a, b, label_a, label_b):
     # test Wilcoxona dla par (ten sam badany)
     w, p = stats.wilcoxon(a, b)
-    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else 'ns'
-    print(f'  {label_a} vs {label_b}: W={w:.0f}, p={p:.4f} {sig}')
+    print(f'  {label_a} vs {label_b}: W={w:.0f}, p={p:.4f} {significance(p)}')
+
+CELLS = ['LL+neutral', 'LL+social', 'HL+neutral', 'HL+social']
+CELL_PAIRS = [
+    ('LL+neutral', 'HL+neutral'),
+    ('LL+social',  'HL+social'),
+    ('LL+neutral', 'LL+social'),
+    ('HL+neutral', 'HL+social'),
+    ('LL+neutral', 'HL+social'),
+]
 
 def run_tests(df_correct, df_all):
     print('\n' + '='*60)
     print('TESTY STATYSTYCZNE')
     print('='*60)
 
-    rt = df_correct['czas_reakcji_ms']
-    load = df_correct['load_condition']
-    cat = df_correct['icon_category']
+    engine = RankEngine(df_correct)  # jedno sortowanie RT dla testow 1-4
 
     # 1. Efekt load (LL vs HL)
     print('\n1. Efekt obciazenia poznawczego (LL vs HL) — RT:')
-    mann_whitney(
-        df_correct[load == 'LL']['czas_reakcji_ms'],
-        df_correct[load == 'HL']['czas_reakcji_ms'],
-        'LL', 'HL'
-    )
+    print_mann_whitney(engine.mann_whitney('LL', 'HL'), 'LL', 'HL')
 
     # 2. Efekt kategorii ikony (social vs neutral)
     print('\n2. Efekt kategorii ikony (social vs neutral) — RT:')
-    mann_whitney(
-        df_correct[cat == 'social']['czas_reakcji_ms'],
-        df_correct[cat == 'neutral']['czas_reakcji_ms'],
-        'social', 'neutral'
-    )
+    print_mann_whitney(engine.mann_whitney('social', 'neutral'), 'social', 'neutral')
 
     # 3. Porownanie wszystkich 4 warunkow
     print('\n3. Porownanie warunkow:')
-    conds = {
-        'LL+neutral': df_correct[(load=='LL') & (cat=='neutral')]['czas_reakcji_ms'],
-        'LL+social':  df_correct[(load=='LL') & (cat=='social')]['czas_reakcji_ms'],
-        'HL+neutral': df_correct[(load=='HL') & (cat=='neutral')]['czas_reakcji_ms'],
-        'HL+social':  df_correct[(load=='HL') & (cat=='social')]['czas_reakcji_ms'],
-    }
-    pairs = [
-        ('LL+neutral', 'HL+neutral'),
-        ('LL+social',  'HL+social'),
-        ('LL+neutral', 'LL+social'),
-        ('HL+neutral', 'HL+social'),
-        ('LL+neutral', 'HL+social'),
-    ]
-    for a, b in pairs:
-        mann_whitney(conds[a], conds[b], a, b)
+    for (a, b), res in zip(CELL_PAIRS, engine.contrasts(CELL_PAIRS)):
+        print_mann_whitney(res, a, b)
 
     # 4. Kruskal-Wallis (omnibus)
     print('\n4. Test Kruskal-Wallis (wszystkie 4 warunki):')
-    h, p = stats.kruskal(*conds.values())
-    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else 'ns'
-    print(f'  H={h:.3f}, p={p:.4f} {sig}')
+    h, p = engine.kruskal(CELLS)
+    print(f'  H={h:.3f}, p={p:.4f} {significance(p)}')
 
     # 5. Accuracy — chi-kwadrat
-    print('\n5. Dokladnosc — test chi-kwadrat (LL vs HL):')
-    ct = pd.crosstab(df_all['load_condition'], df_all['czy_poprawna'])
-    chi2, p, dof, _ = stats.chi2_contingency(ct)
-    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else 'ns'
-    print(f'  chi2={chi2:.3f}, df={dof}, p={p:.4f} {sig}')
-
-    print('\n5b. Dokladnosc — test chi-kwadrat (social vs neutral):')
-    ct2 = pd.crosstab(df_all['icon_category'], df_all['czy_poprawna'])
-    chi2, p, dof, _ = stats.chi2_contingency(ct2)
-    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else 'ns'
-    print(f'  chi2={chi2:.3f}, df={dof}, p={p:.4f} {sig}')
+    accuracy_tests(pd.crosstab(df_all['load_condition'], df_all['czy_poprawna']),
+                   pd.crosstab(df_all['icon_category'], df_all['czy_poprawna']))
 
     # 6. Korelacja RT z numerem proby (efekt praktyki)
     print('\n6. Korelacja RT z numerem proby (efekt praktyki):')
     r, p = stats.spearmanr(df_correct['numer_proby'], df_correct['czas_reakcji_ms'])
-    sig = '***' if p < 0.001 else '**' if p < 0.01 else '*' if p < 0.05 else 'ns'
-    print(f'  rho={r:.3f}, p={p:.4f} {sig}')
+    print(f'  rho={r:.3f}, p={p:.4f} {significance(p)}')
+
+def chi2_test(ct):
+    chi2, p, dof, _ = stats.chi2_contingency(ct)
+    print(f'  chi2={chi2:.3f}, df={dof}, p={p:.4f} {significance(p)}')
+
+def accuracy_tests(ct_load, ct_icon):
+    print('\n5. Dokladnosc — test chi-kwadrat (LL vs HL):')
+    chi2_test(ct_load)
+
+    print('\n5b. Dokladnosc — test chi-kwadrat (social vs neutral):')
+    chi2_test(ct_icon)
+
+# ─────────────────────────────────────────
+#  TRYB STRUMIENIOWY (--strumien)
+# ─────────────────────────────────────────
+# Pliki czytane porcjami; z kazdej porcji do zbiorczych agregatow trafiaja
+# tylko sumy: liczebnosci, suma i suma kwadratow RT, min/max, histogram RT
+# (szkic kwantyli - mediana z dokladnoscia do polowy przedzialu) i tabele
+# kontyngencji poprawnosci. Pamiec zalezy od liczby grup, nie liczby prob.
+
+class RTSketch:
+    """Histogram RT o stalej szerokosci przedzialow w [RT_MIN, RT_MAX]; scalany przez dodanie."""
+    def __init__(self, width=0.5):
+        self.width = width
+        self.counts = np.zeros(int(np.ceil((RT_MAX - RT_MIN) / width)) + 1, dtype=np.int64)
+
+    def add(self, values):
+        idx = ((np.asarray(values, dtype=float) - RT_MIN) / self.width).astype(np.int64)
+        self.counts += np.bincount(np.clip(idx, 0, len(self.counts) - 1), minlength=len(self.counts))
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    def value_at_rank(self, rank):
+        """Srodek przedzialu z rank-ta (od 1) najmniejsza wartoscia - blad <= width/2."""
+        i = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return RT_MIN + (i + 0.5) * self.width
+
+    def quantile(self, q):
+        # jak pandas (interpolacja liniowa miedzy sasiednimi rangami)
+        n = int(self.counts.sum())
+        if not n:
+            return np.nan
+        h = (n - 1) * q + 1
+        lo, hi = int(np.floor(h)), int(np.ceil(h))
+        v_lo = self.value_at_rank(lo)
+        return v_lo + (h - lo) * (self.value_at_rank(hi) - v_lo)
+
+class StreamingStats:
+    """Scalane agregaty per grupa: te same tabele co condition_stats i crosstab."""
+    CROSSTAB_COLUMNS = ['load_condition', 'icon_category']
+
+    def __init__(self, keys=DEFAULT_KEYS, sketch_width=0.5):
+        self.keys = list(keys)
+        self.sketch_width = sketch_width
+        self.rt = {}        # klucz -> [n, suma, suma kwadratow, min, max]
+        self.sketches = {}  # klucz -> RTSketch
+        self.acc = {}       # klucz -> [n, liczba poprawnych]
+        self.crosstabs = {col: {} for col in self.CROSSTAB_COLUMNS}  # (wartosc, poprawna) -> n
+        self.n_trials = 0
+
+    def update(self, chunk):
+        df_all, df_correct = preprocess(chunk)
+        self.n_trials += len(df_all)
+        if df_all.empty:
+            return
+
+        for key, row in df_all.groupby(self.keys, observed=True)['czy_poprawna'].agg(['size', 'sum']).iterrows():
+            acc = self.acc.setdefault(key, [0, 0])
+            acc[0] += int(row['size'])
+            acc[1] += int(row['sum'])
+
+        rt = df_correct.assign(rt2=df_correct['czas_reakcji_ms'] ** 2)
+        grouped = rt.groupby(self.keys, observed=True)
+        sums = grouped.agg(n=('czas_reakcji_ms', 'count'), s=('czas_reakcji_ms', 'sum'),
+                           s2=('rt2', 'sum'), lo=('czas_reakcji_ms', 'min'), hi=('czas_reakcji_ms', 'max'))
+        for key, row in sums.iterrows():
+            agg = self.rt.setdefault(key, [0, 0.0, 0.0, np.inf, -np.inf])
+            agg[0] += int(row['n'])
+            agg[1] += row['s']
+            agg[2] += row['s2']
+            agg[3] = min(agg[3], row['lo'])
+            agg[4] = max(agg[4], row['hi'])
+        for key, values in grouped['czas_reakcji_ms']:
+            key = key[0] if len(self.keys) == 1 else key
+            self.sketches.setdefault(key, RTSketch(self.sketch_width)).add(values.dropna())
+
+        for col in self.CROSSTAB_COLUMNS:
+            counts = df_all.groupby([col, 'czy_poprawna'], observed=True).size()
+            for cell, n in counts.items():
+                self.crosstabs[col][cell] = self.crosstabs[col].get(cell, 0) + int(n)
+
+    def merge(self, other):
+        """Dolacza agregaty z innego StreamingStats (np. innego osrodka albo procesu)."""
+        self.n_trials += other.n_trials
+        for key, (n, n_ok) in other.acc.items():
+            acc = self.acc.setdefault(key, [0, 0])
+            acc[0] += n
+            acc[1] += n_ok
+        for key, (n, s, s2, lo, hi) in other.rt.items():
+            agg = self.rt.setdefault(key, [0, 0.0, 0.0, np.inf, -np.inf])
+            agg[0] += n
+            agg[1] += s
+            agg[2] += s2
+            agg[3] = min(agg[3], lo)
+            agg[4] = max(agg[4], hi)
+        for key, sketch in other.sketches.items():
+            self.sketches.setdefault(key, RTSketch(self.sketch_width)).merge(sketch)
+        for col, cells in other.crosstabs.items():
+            for cell, n in cells.items():
+                self.crosstabs[col][cell] = self.crosstabs[col].get(cell, 0) + n
+
+    def _index(self, keys):
+        if len(self.keys) == 1:
+            return pd.Index(keys, name=self.keys[0])
+        return pd.MultiIndex.from_tuples(keys, names=self.keys)
+
+    def tables(self):
+        """(rt, acc) w tym samym ukladzie co condition_stats."""
+        rt_keys = sorted(self.rt)
+        rows = []
+        for key in rt_keys:
+            n, s, s2, lo, hi = self.rt[key]
+            mean = s / n
+            sd = np.sqrt(max(s2 - s * mean, 0) / (n - 1)) if n > 1 else np.nan
+            rows.append({'n': n, 'mean': mean, 'median': self.sketches[key].quantile(0.5),
+                         'sd': sd, 'min': lo, 'max': hi})
+        rt = pd.DataFrame(rows, index=self._index(rt_keys),
+                          columns=['n', 'mean', 'median', 'sd', 'min', 'max'])
+
+        acc_keys = sorted(self.acc)
+        acc = pd.DataFrame([{'n': self.acc[k][0], 'accuracy': self.acc[k][1] / self.acc[k][0] * 100}
+                            for k in acc_keys], index=self._index(acc_keys), columns=['n', 'accuracy'])
+        return rt, acc
+
+    def crosstab(self, col):
+        cells = self.crosstabs[col]
+        ct = pd.Series(cells, dtype='int64').unstack(fill_value=0)
+        ct.index.name, ct.columns.name = col, 'czy_poprawna'
+        return ct
+
+def stream_stats(pattern='data/result_*.csv', keys=DEFAULT_KEYS, files_per_chunk=200, workers=None,
+                 sketch_width=0.5):
+    result = StreamingStats(keys, sketch_width)
+    n_chunks = 0
+    for chunk in iter_result_chunks(os.path.dirname(pattern) or '.', os.path.basename(pattern),
+                                    files_per_chunk, workers):
+        result.update(chunk)
+        n_chunks += 1
+    if not n_chunks:
+        raise FileNotFoundError(f'Brak plikow pasujacych do: {pattern}')
+    print(f'Przetworzono {result.n_trials} prob eksperymentalnych w {n_chunks} porcjach '
+          f'(po {files_per_chunk} plikow)')
+    return result
 
 # ─────────────────────────────────────────
 #  LEGENDA
@@ -163,8 +408,39 @@ def print_legend():
 # ─────────────────────────────────────────
 
 if __name__ == '__main__':
-    df = load_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None,
+                        help='liczba procesow wczytujacych pliki (domyslnie liczba rdzeni)')
+    parser.add_argument('--grupuj', nargs='+', default=DEFAULT_KEYS,
+                        help='kolumny grupujace statystyki opisowe, np. numer_bloku ikona target')
+    parser.add_argument('--json', default=None,
+                        help='zapisz statystyki opisowe do pliku JSON')
+    parser.add_argument('--strumien', action='store_true',
+                        help='pliki czytane porcjami, tylko zbiorcze agregaty (archiwa wieksze niz RAM)')
+    parser.add_argument('--porcja', type=int, default=200,
+                        help='liczba plikow w porcji w trybie --strumien')
+    parser.add_argument('--szkic', type=float, default=0.5,
+                        help='szerokosc przedzialu histogramu RT (ms) dla median w trybie --strumien')
+    args = parser.parse_args()
+    if args.strumien:
+        streamed = stream_stats(keys=args.grupuj, files_per_chunk=args.porcja,
+                                workers=args.workers, sketch_width=args.szkic)
+        rt, acc = streamed.tables()
+        print_descriptive(rt, acc)
+        if args.json:
+            stats_to_json(rt, acc, args.json)
+        print('\n' + '='*60)
+        print('TESTY STATYSTYCZNE')
+        print('='*60)
+        print(f'\n(tryb --strumien: mediana z histogramu, dokladnosc +-{args.szkic / 2:g} ms;')
+        print(' testy rangowe i korelacja wymagaja pelnych danych - pominiete)')
+        accuracy_tests(streamed.crosstab('load_condition'), streamed.crosstab('icon_category'))
+        print_legend()
+        raise SystemExit(0)
+    df = load_data(workers=args.workers)
     df_all, df_correct = preprocess(df)
-    descriptive_stats(df_correct, df_all)
+    rt, acc = descriptive_stats(df_correct, df_all, args.grupuj)
+    if args.json:
+        stats_to_json(rt, acc, args.json)
     run_tests(df_correct, df_all)
     print_legend()
\ No newline at end of file
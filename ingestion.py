@@ -0,0 +1,193 @@
+import os
+import csv
+import glob
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+# Wspolne wczytywanie plikow result_*.csv dla analyzer.py, plotter.py
+# i Aggregate_results_all_participants.py. Wszystkie wiersze trzymane sa
+# w jednym pliku kolumnowym w data/cache/ razem z manifestem (mtime, rozmiar,
+# sha1 kazdego pliku) - kolejne uruchomienia parsuja tylko pliki nowe
+# albo zmienione, a usuniete wypadaja z cache.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR  = os.path.join(SCRIPT_DIR, 'data', 'cache')
+SOURCE_COLUMN = 'plik'
+
+TEXT_COLUMNS = {'id_badanego', 'id_badacza', 'load_condition', 'icon_category', 'target',
+                'ikona', 'odpowiedz', 'poprawna_odpowiedz'}
+INT_COLUMNS  = {'numer_proby', 'numer_bloku', 'czy_trening', 'n_ksztaltow', 'target_pozycja',
+                'czy_poprawna', 'zgubione_klatki', 'prerender', 'przerwy_planisty'}
+
+# ─────────────────────────────────────────
+#  PARSOWANIE JEDNEGO PLIKU
+# ─────────────────────────────────────────
+
+def detect_separator(path):
+    """Separator z pierwszych 4 KB pliku; domyslnie ';' (format uwaga.py)."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+    if not sample:
+        return ';'
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=';,|\t').delimiter
+    except csv.Error:
+        return ';'
+
+def is_text_column(name):
+    return name in TEXT_COLUMNS or name.startswith(('ksztalt_', 'kolor_'))
+
+def read_result_csv(path):
+    """Jeden plik wynikow z typami: int dla numerow i flag (float, gdy sa braki - jak
+    w pd.read_csv), float dla czasow, tekst dla warunkow i ID (takze '001')."""
+    sep = detect_separator(path)
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader(f, delimiter=sep), [])
+    text_dtypes = {col: str for col in header if is_text_column(col)}
+    df = pd.read_csv(path, sep=sep, encoding='utf-8-sig', dtype=text_dtypes)
+    for col in INT_COLUMNS.intersection(df.columns):
+        values = df[col]
+        if values.dtype == float and values.notna().all() and (values % 1 == 0).all():
+            df[col] = values.astype('int64')
+    df[SOURCE_COLUMN] = os.path.basename(path)
+    return df
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def parse_one(path):
+    """(nazwa, ramka, None) albo (nazwa, None, blad) - blad jednego pliku nie przerywa calosci."""
+    name = os.path.basename(path)
+    try:
+        return name, read_result_csv(path), None
+    except Exception as e:
+        return name, None, f'{type(e).__name__}: {e}'
+
+def parse_files(paths, workers=None):
+    """Parsuje pliki (workers > 1: w puli procesow); zwraca ({nazwa: ramka}, {nazwa: blad})
+    w kolejnosci paths, niezaleznie od kolejnosci konczenia sie procesow."""
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(paths) > 1:
+        workers = min(workers, len(paths))
+        chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(parse_one, paths, chunksize=chunksize))
+    else:
+        parsed = [parse_one(path) for path in paths]
+
+    frames, errors = {}, {}
+    for name, frame, error in parsed:
+        if error is None:
+            frames[name] = frame
+        else:
+            errors[name] = error
+    return frames, errors
+
+def concat_frames(frames):
+    """Sklejenie ramek o roznych zestawach kolumn: suma kolumn w kolejnosci pierwszego
+    wystapienia, kolumna liczbowa w jednym pliku i tekstowa w innym - tekst wszedzie."""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=[SOURCE_COLUMN])
+    mixed = set()
+    numeric = {}
+    for frame in frames:
+        for col in frame.columns:
+            is_num = pd.api.types.is_numeric_dtype(frame[col])
+            if numeric.setdefault(col, is_num) != is_num:
+                mixed.add(col)
+    if mixed:
+        frames = [f.astype({col: 'string' for col in mixed if col in f.columns}) for f in frames]
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+# ─────────────────────────────────────────
+#  CACHE
+# ─────────────────────────────────────────
+
+def cache_paths(directory, pattern):
+    key = hashlib.sha1(f'{os.path.abspath(directory)}|{pattern}'.encode()).hexdigest()[:10]
+    base = os.path.join(CACHE_DIR, f'wyniki_{key}')
+    return base + '.parquet', base + '.json'
+
+def read_cache(data_path, manifest_path):
+    if not (os.path.exists(data_path) and os.path.exists(manifest_path)):
+        return None, {}
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        return pd.read_parquet(data_path), manifest
+    except Exception as e:
+        print(f'UWAGA: uszkodzony cache ({e}) - wczytuje wszystko od nowa')
+        return None, {}
+
+def write_cache(df, manifest, data_path, manifest_path):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(data_path + '.tmp', index=False)
+    os.replace(data_path + '.tmp', data_path)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def load_results(directory='results', pattern='result_*.csv', verbose=True, workers=None):
+    """Wszystkie pliki wynikow z katalogu jako jedna ramka (kolumna 'plik' = zrodlo).
+    workers - liczba procesow parsujacych nowe pliki (domyslnie liczba rdzeni, 1 = bez puli)."""
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    data_path, manifest_path = cache_paths(directory, pattern)
+    cached, manifest = read_cache(data_path, manifest_path)
+
+    current, to_parse = {}, []
+    for path in paths:
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        entry = {'mtime': stat.st_mtime, 'size': stat.st_size}
+        known = manifest.get(name)
+        if cached is not None and known and known['mtime'] == entry['mtime'] and known['size'] == entry['size']:
+            current[name] = known
+            continue
+        entry['sha1'] = file_hash(path)
+        if cached is not None and known and known['sha1'] == entry['sha1']:
+            current[name] = {**known, **entry}  # tylko dotkniety - bez parsowania
+            continue
+        current[name] = entry
+        to_parse.append(path)
+
+    frames, errors = parse_files(to_parse, workers)
+    for name in errors:
+        del current[name]
+    for name, frame in frames.items():
+        current[name]['wiersze'] = len(frame)
+
+    kept = []
+    if cached is not None:
+        unchanged = [name for name in current if name not in frames]
+        kept = [cached[cached[SOURCE_COLUMN].isin(unchanged)]]
+
+    changed = bool(to_parse) or current != manifest
+    # wiersze w kolejnosci plikow (jak sorted(paths)), niezaleznie od historii cache
+    df = concat_frames(kept + list(frames.values()))
+    df = df.sort_values(SOURCE_COLUMN, kind='stable', ignore_index=True)
+    if changed:
+        write_cache(df, current, data_path, manifest_path)
+
+    if verbose:
+        print(f'Pliki wynikow: {len(current)} (nowe/zmienione: {len(frames)}, '
+              f'z cache: {len(current) - len(frames)})')
+    for name, message in errors.items():
+        print(f'  BLAD ({name}): {message}')
+    return df
+
+def iter_result_chunks(directory='results', pattern='result_*.csv', files_per_chunk=200, workers=None):
+    """Pliki wynikow porcjami po files_per_chunk plikow (tryb strumieniowy) - w pamieci
+    jest najwyzej jedna porcja; bez cache, bo cache sklada cale archiwum."""
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    for start in range(0, len(paths), files_per_chunk):
+        frames, errors = parse_files(paths[start:start + files_per_chunk], workers)
+        for name, message in errors.items():
+            print(f'  BLAD ({name}): {message}')
+        yield concat_frames(frames.values())
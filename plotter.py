@@ -5,6 +5,7 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib.colors import hsv_to_rgb
 from matplotlib.backends.backend_pdf import PdfPages
+from ingestion import load_results, read_result_csv, SOURCE_COLUMN
 
 CONDITIONS = [
     ('LL', 'social',  'LL + Social media', '#4C72B0'),
@@ -17,13 +18,8 @@ def load_data(filepath):
     ext = os.path.splitext(filepath)[1].lower()
     if ext in ('.xlsx', '.xls'):
         return pd.read_excel(filepath)
-    try:
-        df = pd.read_csv(filepath, sep=';', encoding='utf-8-sig')
-        if df.shape[1] == 1:
-            df = pd.read_csv(filepath, sep=',', encoding='utf-8-sig')
-        return df
-    except Exception:
-        return pd.read_csv(filepath, encoding='utf-8-sig')
+    # jeden plik - bez wczytywania archiwum, typy kolumn jak w cache
+    return read_result_csv(filepath)
 
 def preprocess(df):
     if 'czy_trening' in df.columns:
@@ -239,9 +235,10 @@ def pick_file():
 
     return os.path.join(DATA_DIR, files[idx])
 
-def process_file(input_file, output_file):
+def process_file(input_file, output_file, df=None):
     print(f"\nWczytuję: {os.path.basename(input_file)}")
-    df  = preprocess(load_data(input_file))
+    # df podany = wiersze tego pliku z cache (ingestion.py); inaczej czytany wprost
+    df  = preprocess(load_data(input_file) if df is None else df)
     pid = str(df['id_badanego'].iloc[0]) if 'id_badanego' in df.columns and len(df) else None
     print(f"Prob: {len(df)}  |  badany: {pid or '?'}")
     print_summary(df)
@@ -264,12 +261,14 @@ def main():
         os.makedirs(PLOTS_DIR, exist_ok=True)
         files = get_data_files()
         print(f"\nPrzetwarzam {len(files)} plikow -> {PLOTS_DIR}")
+        results = load_results(DATA_DIR)
         datasets = []
-        for fname in files:
+        # jeden przebieg grupowania zamiast filtrowania calego archiwum dla kazdego pliku
+        for fname, frame in results.groupby(SOURCE_COLUMN, sort=True):
             input_file  = os.path.join(DATA_DIR, fname)
             output_file = os.path.join(PLOTS_DIR, os.path.splitext(fname)[0] + '_wykres.pdf')
             try:
-                datasets.append(process_file(input_file, output_file))
+                datasets.append(process_file(input_file, output_file, frame))
             except Exception as e:
                 print(f"  BLAD ({fname}): {e}")
         if datasets:
@@ -1,16 +1,64 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from psychopy import visual, core, event, gui
 import os
 import sys
+import argparse
 import random
 import csv
 import configparser
 import shutil
+import numpy as np
 from numpy import sin, cos, deg2rad, linspace
 from datetime import datetime
 import glob
+import platform
+import gc
+import json
+import time
+import re
+import sqlite3
+import hashlib
+import difflib
+import io
+import queue
+import threading
+import atexit
+import traceback
+
+# ==================== TRYB URUCHOMIENIA ====================
+# --headless: bez okna i dialogow PsychoPy, odpowiedzi generuje symulowany
+# badany (sekcja [SYMULACJA] konfiguracji). Sluzy do testow obciazeniowych
+# i generowania realistycznych plikow wynikow na maszynach bez ekranu.
+parser = argparse.ArgumentParser(description='Eksperyment - przeszukiwanie sceny wzrokowej')
+parser.add_argument('--headless', action='store_true',
+                    help='tryb bez okna z symulowanym badanym')
+parser.add_argument('--config', default=os.path.join('config', 'config_test.ini'),
+                    help='plik konfiguracji w trybie --headless')
+parser.add_argument('--sesje', type=int, default=1,
+                    help='liczba symulowanych sesji w trybie --headless')
+parser.add_argument('--seed', type=int, default=None,
+                    help='ziarno pierwszej symulowanej sesji (kolejne: seed+1, ...)')
+parser.add_argument('--odbuduj-rejestr', action='store_true',
+                    help='odbudowuje rejestr badanych z plikow results/result_*.csv i konczy')
+parser.add_argument('--wyjscie', default=None,
+                    help='katalog na results/ i data/ (domyslnie biezacy, w trybie --headless: symulacja/)')
+ARGS, _ = parser.parse_known_args()
+HEADLESS = ARGS.headless
+
+# Symulowani badani trafiaja do osobnego drzewa (wyniki, dzienniki, plany,
+# podsumowania i rejestr), zeby nie mieszaly sie z danymi badania
+# czytanymi przez analyzer.py, plotter.py i agregacje.
+OUTPUT_DIR = ARGS.wyjscie if ARGS.wyjscie is not None else ('symulacja' if HEADLESS else '')
+RESULTS_DIR = os.path.join(OUTPUT_DIR, 'results')
+DATA_DIR = os.path.join(OUTPUT_DIR, 'data')
+
+if HEADLESS or ARGS.odbuduj_rejestr:
+    # bez okna - z PsychoPy potrzebny jest tylko zegar
+    from psychopy import core
+    visual = event = gui = None
+else:
+    from psychopy import visual, core, event, gui
 
 # ==================== KATALOG KONFIGURACJI ====================
 CONFIG_DIR = 'config'
@@ -36,7 +84,7 @@ screen_height = 1080
 
 [WERSJA]
 # Wersja A: klawisz A = trojkat, klawisz L = romb
-# Wersja B: klawisz L = trojkat, klawisz A = rombe
+# Wersja B: klawisz L = trojkat, klawisz A = romb
 wersja = A
 
 [IKONA]
@@ -56,21 +104,95 @@ fixation_time = 0.5
 stimulus_time = 0.1
 max_response_time = 2.0
 feedback_time = 0.5
+# True: fazy proby liczone w klatkach (flipach) wg zmierzonego odswiezania
+frame_locked = True
 
 [PROBY]
 n_training_trials = 8
 n_experimental_trials = 32
 n_blocks = 4
 
+[PREZENTACJA]
+# bufor: plansza skladana przed proba w jeden obraz (jedno draw() przed flipem)
+# osobno: kazdy ksztalt i ikona rysowane osobno
+rysowanie = bufor
+# True: plansza kolejnej proby skladana poza ekranem w czasie feedbacku biezacej
+prerender = True
+# True: ikony skalowane do rozmiaru ekranowego i sklejane w atlas (data/atlas/),
+# budowany raz i odtwarzany z dysku, dopoki nie zmienia sie ikony lub rozdzielczosc
+atlas_ikon = True
+# True: od fiksacji do odpowiedzi wylaczony GC i podniesiony priorytet (core.rush);
+# w wynikach czas jawnego GC w przerwie i (tylko z frame_locked) przestoje
+# klatek dluzsze niz prog_pauzy_ms
+czas_rzeczywisty = False
+prog_pauzy_ms = 2
+
+[KALIBRACJA]
+# Przed instrukcja: n_klatek flipow pustego ekranu i z zaslonieta plansza HL oraz koszt odpytania
+# klawiatury; wynik w podsumowaniu i w data/calibration/. odmowa = True: sesja nie startuje,
+# gdy czas bodzca odbiega od wielokrotnosci klatki o wiecej niz tolerancja_bodzca_ms
+# albo z plansza gubionych jest wiecej niz maks_zgubione (ulamek) klatek
+kalibracja = True
+n_klatek = 300
+tolerancja_bodzca_ms = 4
+maks_zgubione = 0.02
+odmowa = True
+
+[POMIAR]
+# True: znaczniki czasu flipow kazdej fazy i zmierzone czasy faz w pliku wynikow,
+# histogram odchylen w podsumowaniu
+instrumentacja = False
+
+[ODPOWIEDZI]
+# keyboard: psychopy.hardware.keyboard (czas key-down z urzadzenia)
+# event: event.waitKeys (zapasowy)
+backend = keyboard
+
+[ZAPIS]
+# dodatkowy plik wynikow obok CSV, z typami kolumn i metryczka sesji:
+# parquet | feather (pyarrow) | npz | brak
+format_kolumnowy = parquet
+# True: zapis na dysk w osobnym watku (kolejka ograniczona do kolejka_zapisu zadan)
+zapis_w_tle = True
+kolejka_zapisu = 256
+
 [FEEDBACK]
 show_feedback = True
+# True: na planszy przerwy poprawnosc i sredni RT z ukonczonego bloku
+# (w konsoli wypisywane zawsze)
+statystyki_na_przerwie = False
+
+[LABORATORIUM]
+# True: kilka stanowisk z jednym rejestrem (SQLite) - ID badanego (puste pole = kolejne
+# wolne ID z prefiksem) i wersja A/B przydzielane atomowo, wersja wg licznosci;
+# [WERSJA] wersja rozstrzyga remis
+tryb_laboratoryjny = False
+rejestr = results/registry.sqlite
+prefiks_id =
 
 [APLIKACJE]
-social_apps = icons/tiktok.png, icons/messenger.png, icons/instagram.png, icons/x.png
-neutral_apps = icons/clock.png, icons/calculator.png, icons/notepad.png, icons/calendar.png
+social_apps = tiktok.png, messenger.png, instagram.png
+neutral_apps = clock.png, calculator.png, notepad.png
+
+[SYMULACJA]
+# Symulowany badany (python uwaga.py --headless): RT z rozkladu ex-Gaussa w ms.
+# Kazdy parametr mozna nadpisac dla warunku, np. rt_mu_HL_social
+rt_mu = 520
+rt_sigma = 60
+rt_tau = 110
+accuracy = 0.94
+brak_odpowiedzi = 0.01
+rt_mu_LL_social = 535
+rt_mu_HL_neutral = 590
+rt_mu_HL_social = 610
+accuracy_HL_neutral = 0.91
+accuracy_HL_social = 0.90
 """
 
     badanie_config = """# ==================== KONFIGURACJA BADANIA ====================
+# Badanie w toku: opcje zmieniajace prezentacje bodzcow albo pomiar RT
+# (frame_locked, rysowanie, prerender, atlas_ikon, backend) zostaja przy
+# dotychczasowym zachowaniu - wlaczac tylko na poczatku nowej serii badan.
 [EKSPERYMENT]
 nazwa = badanie
 opis = Pelne badanie eksperymentalne
@@ -102,18 +224,90 @@ fixation_time = 0.5
 stimulus_time = 0.1
 max_response_time = 2.0
 feedback_time = 0.5
+# True: fazy proby liczone w klatkach (flipach) wg zmierzonego odswiezania
+frame_locked = False
 
 [PROBY]
 n_training_trials = 32
 n_experimental_trials = 320
 n_blocks = 4
 
+[PREZENTACJA]
+# bufor: plansza skladana przed proba w jeden obraz (jedno draw() przed flipem)
+# osobno: kazdy ksztalt i ikona rysowane osobno
+rysowanie = osobno
+# True: plansza kolejnej proby skladana poza ekranem w czasie feedbacku biezacej
+prerender = False
+# True: ikony skalowane do rozmiaru ekranowego i sklejane w atlas (data/atlas/),
+# budowany raz i odtwarzany z dysku, dopoki nie zmienia sie ikony lub rozdzielczosc
+atlas_ikon = False
+# True: od fiksacji do odpowiedzi wylaczony GC i podniesiony priorytet (core.rush);
+# w wynikach czas jawnego GC w przerwie i (tylko z frame_locked) przestoje
+# klatek dluzsze niz prog_pauzy_ms
+czas_rzeczywisty = False
+prog_pauzy_ms = 2
+
+[KALIBRACJA]
+# Przed instrukcja: n_klatek flipow pustego ekranu i z zaslonieta plansza HL oraz koszt odpytania
+# klawiatury; wynik w podsumowaniu i w data/calibration/. odmowa = True: sesja nie startuje,
+# gdy czas bodzca odbiega od wielokrotnosci klatki o wiecej niz tolerancja_bodzca_ms
+# albo z plansza gubionych jest wiecej niz maks_zgubione (ulamek) klatek
+kalibracja = False
+n_klatek = 300
+tolerancja_bodzca_ms = 4
+maks_zgubione = 0.02
+odmowa = False
+
+[POMIAR]
+# True: znaczniki czasu flipow kazdej fazy i zmierzone czasy faz w pliku wynikow,
+# histogram odchylen w podsumowaniu
+instrumentacja = False
+
+[ODPOWIEDZI]
+# keyboard: psychopy.hardware.keyboard (czas key-down z urzadzenia)
+# event: event.waitKeys (zapasowy)
+backend = event
+
+[ZAPIS]
+# dodatkowy plik wynikow obok CSV, z typami kolumn i metryczka sesji:
+# parquet | feather (pyarrow) | npz | brak
+format_kolumnowy = brak
+# True: zapis na dysk w osobnym watku (kolejka ograniczona do kolejka_zapisu zadan)
+zapis_w_tle = True
+kolejka_zapisu = 256
+
 [FEEDBACK]
 show_feedback = True
+# True: na planszy przerwy poprawnosc i sredni RT z ukonczonego bloku
+# (w konsoli wypisywane zawsze)
+statystyki_na_przerwie = False
+
+[LABORATORIUM]
+# True: kilka stanowisk z jednym rejestrem (SQLite) - ID badanego (puste pole = kolejne
+# wolne ID z prefiksem) i wersja A/B przydzielane atomowo, wersja wg licznosci;
+# [WERSJA] wersja rozstrzyga remis
+tryb_laboratoryjny = False
+rejestr = results/registry.sqlite
+prefiks_id =
 
 [APLIKACJE]
-social_apps = icons/tiktok.png, icons/messenger.png, icons/instagram.png, icons/x.png
-neutral_apps = icons/clock.png, icons/calculator.png, icons/notepad.png, icons/calendar.png
+social_apps = tiktok.png, messenger.png, instagram.png
+neutral_apps = clock.png, calculator.png, notepad.png
+
+
+[SYMULACJA]
+# Symulowany badany (python uwaga.py --headless): RT z rozkladu ex-Gaussa w ms.
+# Kazdy parametr mozna nadpisac dla warunku, np. rt_mu_HL_social
+rt_mu = 520
+rt_sigma = 60
+rt_tau = 110
+accuracy = 0.94
+brak_odpowiedzi = 0.01
+rt_mu_LL_social = 535
+rt_mu_HL_neutral = 590
+rt_mu_HL_social = 610
+accuracy_HL_neutral = 0.91
+accuracy_HL_social = 0.90
 """
 
     with open(os.path.join(CONFIG_DIR, 'config_test.ini'), 'w', encoding='utf-8') as f:
@@ -238,8 +432,8 @@ n_blocks = 4
 show_feedback = {data[18]}
 
 [APLIKACJE]
-social_apps = icons/tiktok.png, icons/messenger.png, icons/instagram.png, icons/x.png
-neutral_apps = icons/clock.png, icons/calculator.png, icons/notepad.png, icons/calendar.png
+social_apps = tiktok.png, messenger.png, instagram.png
+neutral_apps = clock.png, calculator.png, notepad.png
 """
 
     with open(config_path, 'w', encoding='utf-8') as f:
@@ -278,6 +472,7 @@ def load_config(config_file):
     cfg['stimulus_time'] = config.getfloat('CZASY', 'stimulus_time', fallback=0.1)
     cfg['max_response_time'] = config.getfloat('CZASY', 'max_response_time', fallback=2.0)
     cfg['feedback_time'] = config.getfloat('CZASY', 'feedback_time', fallback=0.5)
+    cfg['frame_locked'] = config.getboolean('CZASY', 'frame_locked', fallback=False)
 
     cfg['n_training_trials'] = config.getint('PROBY', 'n_training_trials', fallback=32)
     cfg['n_experimental_trials'] = config.getint('PROBY', 'n_experimental_trials', fallback=320)
@@ -285,10 +480,33 @@ def load_config(config_file):
     cfg['trials_per_block'] = cfg['n_experimental_trials'] // cfg['n_blocks']
     cfg['n_shapes'] = config.getint('KSZTALTY', 'n_shapes', fallback=6)
 
+    cfg['columnar_format'] = config.get('ZAPIS', 'format_kolumnowy', fallback='brak').strip().lower()
+    cfg['background_io'] = config.getboolean('ZAPIS', 'zapis_w_tle', fallback=True)
+    cfg['io_queue_size'] = config.getint('ZAPIS', 'kolejka_zapisu', fallback=256)
     cfg['show_feedback'] = config.getboolean('FEEDBACK', 'show_feedback', fallback=True)
-
-    social_str = config.get('APLIKACJE', 'social_apps', fallback='icons/tiktok.png, icons/messenger.png, icons/instagram.png, icons/x.png')
-    neutral_str = config.get('APLIKACJE', 'neutral_apps', fallback='icons/clock.png, icons/calculator.png, icons/notepad.png, icons/calendar.png')
+    cfg['calibration'] = config.getboolean('KALIBRACJA', 'kalibracja', fallback=False)
+    cfg['calibration_flips'] = config.getint('KALIBRACJA', 'n_klatek', fallback=300)
+    cfg['calibration_tolerance_ms'] = config.getfloat('KALIBRACJA', 'tolerancja_bodzca_ms', fallback=4.0)
+    cfg['calibration_max_dropped'] = config.getfloat('KALIBRACJA', 'maks_zgubione', fallback=0.02)
+    cfg['calibration_refuse'] = config.getboolean('KALIBRACJA', 'odmowa', fallback=False)
+    cfg['lab_mode'] = config.getboolean('LABORATORIUM', 'tryb_laboratoryjny', fallback=False)
+    cfg['lab_registry'] = config.get('LABORATORIUM', 'rejestr',
+                                     fallback=os.path.join(RESULTS_DIR, 'registry.sqlite'))
+    cfg['lab_id_prefix'] = config.get('LABORATORIUM', 'prefiks_id', fallback='')
+    cfg['stats_on_break'] = config.getboolean('FEEDBACK', 'statystyki_na_przerwie', fallback=False)
+
+    cfg['instrumentacja'] = config.getboolean('POMIAR', 'instrumentacja', fallback=False)
+
+    cfg['render_mode'] = config.get('PREZENTACJA', 'rysowanie', fallback='osobno').strip().lower()
+    cfg['prerender'] = config.getboolean('PREZENTACJA', 'prerender', fallback=False)
+    cfg['icon_atlas'] = config.getboolean('PREZENTACJA', 'atlas_ikon', fallback=False)
+    cfg['realtime'] = config.getboolean('PREZENTACJA', 'czas_rzeczywisty', fallback=False)
+    cfg['pause_threshold_ms'] = config.getfloat('PREZENTACJA', 'prog_pauzy_ms', fallback=2.0)
+
+    cfg['response_backend'] = config.get('ODPOWIEDZI', 'backend', fallback='event').strip().lower()
+
+    social_str = config.get('APLIKACJE', 'social_apps', fallback='tiktok.png, messenger.png, instagram.png')
+    neutral_str = config.get('APLIKACJE', 'neutral_apps', fallback='clock.png, calculator.png, notepad.png')
 
     def fix_icon_path(p):
         p = p.strip()
@@ -299,12 +517,148 @@ def load_config(config_file):
     cfg['social_apps']  = [fix_icon_path(x) for x in social_str.split(',')]
     cfg['neutral_apps'] = [fix_icon_path(x) for x in neutral_str.split(',')]
 
+    # Symulowany badany (--headless): RT z rozkladu ex-Gaussa (ms), kazdy
+    # parametr mozna nadpisac dla warunku, np. rt_mu_HL_social = 640
+    sim_defaults = {'rt_mu': 520.0, 'rt_sigma': 60.0, 'rt_tau': 110.0,
+                    'accuracy': 0.94, 'brak_odpowiedzi': 0.01}
+    sim_base = {k: config.getfloat('SYMULACJA', k, fallback=v) for k, v in sim_defaults.items()}
+    cfg['symulacja'] = {}
+    for load_cond in ['LL', 'HL']:
+        for icon_cat in ['social', 'neutral']:
+            cfg['symulacja'][(load_cond, icon_cat)] = {
+                k: config.getfloat('SYMULACJA', f'{k}_{load_cond}_{icon_cat}', fallback=v)
+                for k, v in sim_base.items()
+            }
+
     return cfg
 
 
+# ==================== REJESTR BADANYCH ====================
+# Baza SQLite w results/ z jednym wierszem na zapisany plik wynikow - zamiast
+# przeszukiwania katalogu przy kazdym ID. Wiele stanowisk moze pisac naraz:
+# zapisy ida w transakcjach BEGIN IMMEDIATE, a czekanie na blokade
+# ogranicza timeout polaczenia.
+REGISTRY_PATH = os.path.join(RESULTS_DIR, 'registry.sqlite')
+RESULT_NAME_RE = re.compile(r'^result_(.+)_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.csv$')
+
+
+def open_registry():
+    os.makedirs(os.path.dirname(REGISTRY_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(REGISTRY_PATH, timeout=30, isolation_level=None)
+    conn.execute("""CREATE TABLE IF NOT EXISTS badani (
+                        id          TEXT NOT NULL,
+                        timestamp   TEXT NOT NULL,
+                        plik        TEXT NOT NULL UNIQUE,
+                        stanowisko  TEXT
+                    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS badani_id ON badani (id)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (klucz TEXT PRIMARY KEY, wartosc TEXT)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS przydzialy (
+                        id          TEXT PRIMARY KEY,
+                        wersja      TEXT NOT NULL,
+                        stanowisko  TEXT,
+                        czas        TEXT NOT NULL,
+                        status      TEXT NOT NULL DEFAULT 'w_toku'
+                    )""")
+    return conn
+
+
+def rebuild_registry(conn=None):
+    """Wpisuje do rejestru wszystkie istniejace pliki RESULTS_DIR/result_*.csv."""
+    own = conn is None
+    conn = conn or open_registry()
+    rows = []
+    for path in glob.glob(os.path.join(RESULTS_DIR, 'result_*.csv')):
+        match = RESULT_NAME_RE.match(os.path.basename(path))
+        if match:
+            rows.append((match.group(1), match.group(2), os.path.basename(path)))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("INSERT OR IGNORE INTO badani (id, timestamp, plik) VALUES (?, ?, ?)", rows)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('zbudowany', ?)",
+                     (datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if own:
+        conn.close()
+    print(f"Rejestr badanych: {len(rows)} plików wyników ({REGISTRY_PATH})")
+    return len(rows)
+
+
+def register_result(participant_id, timestamp, filename):
+    conn = open_registry()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT OR IGNORE INTO badani (id, timestamp, plik, stanowisko) VALUES (?, ?, ?, ?)",
+                     (participant_id, timestamp, os.path.basename(filename), platform.node()))
+        conn.execute("UPDATE przydzialy SET status = 'zakonczona' WHERE id = ?", (participant_id,))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+# Tryb laboratoryjny: kilka stanowisk z jednym rejestrem. ID badanego i wersja
+# A/B przydzielane w jednej transakcji BEGIN IMMEDIATE - dwa stanowiska nie
+# dostana tego samego ID, a wersja to ta, ktorej dotad przydzielono mniej.
+def allocate_participant(requested_id='', prefix='', default_version='A'):
+    """Zwraca (id, wersja) albo None, gdy requested_id jest juz zajete."""
+    conn = open_registry()
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE klucz = 'zbudowany'").fetchone() is None:
+            rebuild_registry(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if requested_id:
+                participant_id = requested_id
+                taken = conn.execute("SELECT 1 FROM badani WHERE id = ? UNION ALL "
+                                     "SELECT 1 FROM przydzialy WHERE id = ?",
+                                     (participant_id, participant_id)).fetchone()
+                if taken:
+                    conn.execute("ROLLBACK")
+                    return None
+            else:
+                id_re = re.compile(rf'^{re.escape(prefix)}(\d+)$')
+                used = [0]
+                for (pid,) in conn.execute("SELECT id FROM badani UNION SELECT id FROM przydzialy"):
+                    match = id_re.match(pid)
+                    if match:
+                        used.append(int(match.group(1)))
+                next_number = max(used) + 1
+                participant_id = f"{prefix}{next_number:03d}"
+
+            counts = dict(conn.execute("SELECT wersja, COUNT(*) FROM przydzialy GROUP BY wersja"))
+            other_version = 'B' if default_version == 'A' else 'A'
+            version = (other_version if counts.get(other_version, 0) < counts.get(default_version, 0)
+                       else default_version)
+
+            conn.execute("INSERT INTO przydzialy (id, wersja, stanowisko, czas) VALUES (?, ?, ?, ?)",
+                         (participant_id, version, platform.node(),
+                          datetime.now().strftime('%Y-%m-%d_%H-%M-%S')))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return participant_id, version
+    finally:
+        conn.close()
+
+
+if ARGS.odbuduj_rejestr:
+    rebuild_registry()
+    sys.exit(0)
+
+
 # ==================== GŁÓWNY PROGRAM ====================
-config_file, config_is_custom = select_config()
+if HEADLESS:
+    config_file, config_is_custom = ARGS.config, False
+else:
+    config_file, config_is_custom = select_config()
 CFG = load_config(config_file)
+if CFG['lab_mode'] and not HEADLESS:
+    REGISTRY_PATH = CFG['lab_registry']
+    print(f"Tryb laboratoryjny: wspólny rejestr {REGISTRY_PATH}, stanowisko {platform.node()}")
 
 print(f"Wczytano konfigurację: {config_file}")
 print(f"Nazwa: {CFG['nazwa']}")
@@ -315,13 +669,459 @@ print(f"Próby eksperymentalne: {CFG['n_experimental_trials']} ({CFG['n_blocks']
 
 # ==================== SPRAWDZENIE ISTNIEJĄCYCH ID ====================
 def check_existing_id(participant_id):
-    os.makedirs('results', exist_ok=True)
-    existing_files = glob.glob(f'results/result_{participant_id}_*.csv')
-    return len(existing_files) > 0
+    conn = open_registry()
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE klucz = 'zbudowany'").fetchone() is None:
+            # pierwszy start z rejestrem - wpisz archiwum wynikow
+            rebuild_registry(conn)
+        return conn.execute("SELECT 1 FROM badani WHERE id = ? LIMIT 1",
+                            (participant_id,)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+
+# ==================== ZAPIS W TLE ====================
+# Operacje na dysku (CSV, podsumowanie, kopia konfiguracji, rejestr, zamkniecie
+# dziennika) wykonuje osobny watek, zeby opoznienia dysku sieciowego nie zatrzymywaly
+# ekranu. Kolejka jest ograniczona - gdy dysk nie nadaza, petla prob czeka
+# przy submit zamiast gromadzic dane w pamieci. Zadania wykonywane sa
+# w kolejnosci zgloszenia; close() czeka na oproznienie kolejki i wypisuje bledy.
+class BackgroundWriter:
+    def __init__(self, maxsize=256, enabled=True):
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.errors = []
+        self.n_done = 0
+        self.closed = False
+        self.thread = None
+        if enabled:
+            self.thread = threading.Thread(target=self._run, name='zapis-w-tle', daemon=True)
+            self.thread.start()
+
+    def _execute(self, fn, args, description):
+        try:
+            fn(*args)
+        except Exception as e:
+            self.errors.append((description, e))
+            print(f"BŁĄD zapisu ({description}): {e}")
+            traceback.print_exc()
+        self.n_done += 1
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                self._execute(*job)
+            finally:
+                self.jobs.task_done()
+
+    def submit(self, fn, *args, description=''):
+        """Zleca fn(*args); bez watku (zapis_w_tle = False) wykonuje od razu."""
+        if self.thread is None:
+            self._execute(fn, args, description or fn.__name__)
+        else:
+            self.jobs.put((fn, args, description or fn.__name__))
+
+    def flush(self):
+        if self.thread is not None:
+            self.jobs.join()
+
+    def close(self):
+        """Konczy watek po wykonaniu wszystkich zadan; zwraca liste bledow."""
+        if self.closed:
+            return self.errors
+        self.closed = True
+        if self.thread is not None:
+            self.jobs.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.errors:
+            print(f"UWAGA: {len(self.errors)} z {self.n_done} operacji zapisu nie powiodło się:")
+            for description, e in self.errors:
+                print(f"  {description}: {e}")
+        return self.errors
+
+
+writer = BackgroundWriter(CFG['io_queue_size'], enabled=CFG['background_io'])
+atexit.register(writer.close)
+
+
+# ==================== DZIENNIK SESJI ====================
+# Kazda proba jest dopisywana do dziennika (JSON Lines) i zrzucana na dysk
+# od razu po zakonczeniu, wiec awaria w trakcie sesji nie traci danych.
+# Kazda sesja ma wlasny plik (ID badanego + czas rozpoczecia), wiec zamkniety
+# dziennik wczesniejszej sesji tego samego ID nie przykrywa przerwanej.
+# Pierwsza linia to naglowek z ziarnem losowania - z niego odtwarzana jest
+# lista prob przy wznowieniu; ostatnia linia {"typ": "koniec"} zamyka sesje.
+JOURNAL_DIR = os.path.join(DATA_DIR, 'journals')
+
+def journal_path(participant_id, timestamp):
+    return os.path.join(JOURNAL_DIR, f"journal_{participant_id}_{timestamp}.jsonl")
+
+
+def read_journal(path):
+    """Zwraca (naglowek, lista rekordow, czy_zakonczony, sciezka) albo None, gdy brak dziennika."""
+    if not os.path.exists(path):
+        return None
+    header, records, finished = None, [], False
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # urwana ostatnia linia po awarii
+                continue
+            if entry['typ'] == 'naglowek':
+                # kazdy naglowek otwiera nowa sesje
+                header, records, finished = entry, [], False
+            elif entry['typ'] == 'proba':
+                records.append(entry['rekord'])
+            elif entry['typ'] == 'koniec':
+                finished = True
+    if header is None:
+        return None
+    return header, records, finished, path
+
+
+def find_unfinished_journal(participant_id):
+    """Najnowsza niezakonczona sesja danego ID albo None; czytane sa tylko
+    dzienniki tego ID (nazwa pliku), naglowek sprawdzany na wypadek ID,
+    ktore jest przedrostkiem innego."""
+    pattern = os.path.join(JOURNAL_DIR, f"journal_{glob.escape(participant_id)}_*.jsonl")
+    for path in sorted(glob.glob(pattern), reverse=True):
+        journal = read_journal(path)
+        if journal is None or journal[2]:
+            continue
+        if journal[0]['exp_info']['ID badanego'] == participant_id:
+            return journal
+    return None
+
+
+class SessionJournal:
+    def __init__(self, path, header=None):
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        self.path = path
+        self.file = open(self.path, 'a', encoding='utf-8')
+        if header is not None:
+            self.write({'typ': 'naglowek', **header})
+
+    def write(self, entry):
+        if self.file is None:
+            return
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def append(self, record):
+        self.write({'typ': 'proba', 'rekord': record})
+
+    def close(self, finished=True):
+        """finished=False: zamyka plik bez linii koniec - sesje mozna wznowic."""
+        if self.file is None:
+            return
+        if finished:
+            self.write({'typ': 'koniec', 'czas': datetime.now().strftime('%Y-%m-%d_%H-%M-%S')})
+        self.file.close()
+        self.file = None
+
+
+# ==================== MAGAZYN WYNIKÓW ====================
+# Wyniki sesji trzymane kolumnami w prealokowanych tablicach numpy zamiast
+# listy slownikow (~40 kluczy na probe). Kolumny tekstowe (warunki, ksztalty,
+# kolory, klawisze) zapisywane jako kody kategorii. Brak wartosci ('' w CSV):
+# NaN w kolumnach float, MISSING_INT w kolumnach int, -1 w kategoriach.
+MISSING_INT = np.iinfo(np.int32).min
+
+INT_COLUMNS = {'numer_proby', 'numer_bloku', 'czy_trening', 'n_ksztaltow', 'target_pozycja',
+               'czy_poprawna', 'zgubione_klatki', 'prerender', 'przerwy_planisty'}
+CATEGORY_COLUMNS = {'id_badanego', 'id_badacza', 'load_condition', 'icon_category', 'target',
+                    'ikona', 'odpowiedz', 'poprawna_odpowiedz'}
+
+
+def column_kind(name):
+    """'c' - kategoria, 'i' - liczba calkowita, 'f' - liczba rzeczywista."""
+    if name in CATEGORY_COLUMNS or name.startswith(('ksztalt_', 'kolor_')):
+        return 'c'
+    if name in INT_COLUMNS:
+        return 'i'
+    return 'f'
+
+
+class TrialRecord:
+    """Widok jednego wiersza magazynu - r['kolumna'] jak w slowniku, bez kopiowania."""
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, name):
+        return self.store.value(name, self.index)
+
+    def get(self, name, default=None):
+        return self[name] if name in self.store.kinds else default
+
+    def keys(self):
+        return self.store.columns
+
+    def as_dict(self):
+        return {name: self[name] for name in self.store.columns}
+
+
+class TrialStore:
+    """Kolumnowy magazyn prob; kolumny w kolejnosci pierwszego wystapienia. Kolumna,
+    ktorej nie bylo we wczesniejszych rekordach (np. wznowienie ze zmieniona
+    instrumentacja), dochodzi na koncu z brakami w dotychczasowych wierszach."""
+    __slots__ = ('columns', 'kinds', 'data', 'categories', 'codes', 'n', 'capacity')
+
+    def __init__(self, capacity=512):
+        self.columns = []
+        self.kinds = {}
+        self.data = {}
+        self.categories = {}
+        self.codes = {}
+        self.n = 0
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return (TrialRecord(self, i) for i in range(self.n))
+
+    def __getitem__(self, index):
+        if not -self.n <= index < self.n:
+            raise IndexError(index)
+        return TrialRecord(self, index % self.n)
+
+    def _add_column(self, name):
+        kind = column_kind(name)
+        self.columns.append(name)
+        self.kinds[name] = kind
+        if kind == 'f':
+            self.data[name] = np.full(self.capacity, np.nan)
+        elif kind == 'i':
+            self.data[name] = np.full(self.capacity, MISSING_INT, dtype=np.int32)
+        else:
+            self.data[name] = np.full(self.capacity, -1, dtype=np.int16)
+            self.categories[name] = []
+            self.codes[name] = {}
+
+    def reserve(self, capacity):
+        """Powieksza tablice do co najmniej capacity wierszy (jedna alokacja na sesje)."""
+        if capacity <= self.capacity:
+            return
+        for name, column in self.data.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.n] = column[:self.n]
+            self.data[name] = grown
+            self.reset_tail(name)
+        self.capacity = capacity
+
+    def reset_tail(self, name):
+        fill = {'f': np.nan, 'i': MISSING_INT, 'c': -1}[self.kinds[name]]
+        self.data[name][self.n:] = fill
+
+    def append(self, record):
+        for name in record:
+            if name not in self.kinds:
+                self._add_column(name)
+        if self.n == self.capacity:
+            self.reserve(self.capacity * 2)
+        i = self.n
+        for name, value in record.items():
+            if value is None or (isinstance(value, str) and not value):
+                continue
+            kind = self.kinds[name]
+            if kind == 'c':
+                codes = self.codes[name]
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(self.categories[name])
+                    self.categories[name].append(value)
+                self.data[name][i] = code
+            else:
+                self.data[name][i] = value
+        self.n += 1
+
+    def value(self, name, index):
+        """Wartosc komorki tak, jak trafia do CSV ('' gdy brak)."""
+        raw = self.data[name][index]
+        kind = self.kinds[name]
+        if kind == 'f':
+            return '' if np.isnan(raw) else float(raw)
+        if kind == 'i':
+            return '' if raw == MISSING_INT else int(raw)
+        return '' if raw < 0 else self.categories[name][raw]
+
+    def column(self, name):
+        """Tablica wartosci kolumny (dla kategorii - kody, -1 gdy brak)."""
+        return self.data[name][:self.n]
+
+    def code(self, name, value):
+        """Kod kategorii value w kolumnie name; -2, gdy wartosc nie wystapila."""
+        return self.codes[name].get(value, -2)
+
+    def typed_columns(self):
+        """{kolumna: (wartosci, maska brakow, kategorie albo None)} - bez konwersji na tekst."""
+        typed = {}
+        for name in self.columns:
+            kind = self.kinds[name]
+            column = self.data[name][:self.n]
+            if kind == 'f':
+                typed[name] = (column, None, None)
+            elif kind == 'i':
+                missing = column == MISSING_INT
+                typed[name] = (column, missing if missing.any() else None, None)
+            else:
+                categories = [str(c) for c in self.categories[name]]
+                typed[name] = (column, column < 0, categories)
+        return typed
+
+    def rows(self):
+        """Wiersze do csv.writer w kolejnosci kolumn."""
+        getters = [(self.kinds[name], self.data[name], self.categories.get(name))
+                   for name in self.columns]
+        for i in range(self.n):
+            row = []
+            for kind, column, categories in getters:
+                raw = column[i]
+                if kind == 'f':
+                    row.append('' if np.isnan(raw) else float(raw))
+                elif kind == 'i':
+                    row.append('' if raw == MISSING_INT else int(raw))
+                else:
+                    row.append('' if raw < 0 else categories[raw])
+            yield row
+
+
+# ==================== STATYSTYKI BIEŻĄCE ====================
+# Poprawnosc i RT poprawnych odpowiedzi liczone na biezaco (O(1) na probe,
+# srednia i wariancja metoda Welforda) dla kazdego warunku i bloku.
+# Podsumowanie sesji i plansze przerw czytaja z nich bez przegladania wynikow.
+class RunningStats:
+    __slots__ = ('n', 'n_correct', 'n_rt', 'mean_rt', 'm2_rt')
+
+    def __init__(self):
+        self.n = 0
+        self.n_correct = 0
+        self.n_rt = 0
+        self.mean_rt = 0.0
+        self.m2_rt = 0.0
+
+    def update(self, is_correct, rt_ms):
+        self.n += 1
+        if not is_correct:
+            return
+        self.n_correct += 1
+        if rt_ms == '':
+            return
+        self.n_rt += 1
+        delta = rt_ms - self.mean_rt
+        self.mean_rt += delta / self.n_rt
+        self.m2_rt += delta * (rt_ms - self.mean_rt)
+
+    @property
+    def accuracy(self):
+        return self.n_correct / self.n * 100 if self.n else 0
+
+    @property
+    def sd_rt(self):
+        return (self.m2_rt / (self.n_rt - 1)) ** 0.5 if self.n_rt > 1 else 0
+
+
+class ConditionStats:
+    """Statystyki prob eksperymentalnych: ogolem, wg warunku (LL/HL x social/neutral) i wg bloku."""
+
+    def __init__(self):
+        self.total = RunningStats()
+        self.conditions = {}
+        self.blocks = {}
+
+    def update(self, record):
+        if record['czy_trening'] != 0:
+            return
+        is_correct = record['czy_poprawna'] == 1
+        rt_ms = record['czas_reakcji_ms']
+        key = (record['load_condition'], record['icon_category'])
+        self.total.update(is_correct, rt_ms)
+        self.conditions.setdefault(key, RunningStats()).update(is_correct, rt_ms)
+        self.blocks.setdefault(record['numer_bloku'], RunningStats()).update(is_correct, rt_ms)
+
+    def condition(self, load_cond, icon_cat):
+        return self.conditions.get((load_cond, icon_cat), RunningStats())
+
+    def block(self, block_num):
+        return self.blocks.get(block_num, RunningStats())
+
+    def block_report(self, block_num):
+        """Jedna linia dla eksperymentatora: blok i cala sesja do tej pory."""
+        b = self.block(block_num)
+        return (f"Blok {block_num}: poprawność {b.accuracy:.1f}% (n={b.n}), śr. RT {b.mean_rt:.0f} ms | "
+                f"sesja: poprawność {self.total.accuracy:.1f}% (n={self.total.n}), "
+                f"śr. RT {self.total.mean_rt:.0f} ms")
+
+
+# ==================== SESJA ====================
+def start_session(info, seed=None):
+    """Nowa sesja: ziarno planu, metryczka i naglowek dziennika (zapisywany w run_session)."""
+    global exp_info, SESSION_SEED, journal_target, results, stats
+    SESSION_SEED = seed if seed is not None else random.SystemRandom().randrange(2 ** 31)
+    exp_info = info
+    exp_info['data'] = datetime.now().strftime('%Y-%m-%d')
+    exp_info['czas_rozpoczecia'] = datetime.now().strftime('%H:%M:%S')
+    exp_info['timestamp_start'] = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    exp_info['config_file'] = config_file
+    exp_info['config_nazwa'] = CFG['nazwa']
+    exp_info['wersja'] = CFG['wersja']
+    journal_target = (journal_path(exp_info['ID badanego'], exp_info['timestamp_start']), {
+        'seed': SESSION_SEED,
+        'config_is_custom': config_is_custom,
+        'exp_info': exp_info,
+    })
+    results = TrialStore()
+    stats = ConditionStats()
+
+
+def resume_session(unfinished):
+    """Wznowienie: konfiguracja, dane badanego i ziarno z przerwanej sesji."""
+    global exp_info, SESSION_SEED, journal_target, results, stats, config_file, config_is_custom, CFG
+    header, done_records, _, path = unfinished
+    SESSION_SEED = header['seed']
+    exp_info = header['exp_info']
+    config_file = exp_info['config_file']
+    config_is_custom = header['config_is_custom']
+    CFG = load_config(config_file)
+    CFG['wersja'] = exp_info['wersja']
+    journal_target = (path, None)
+    results = TrialStore()
+    stats = ConditionStats()
+    for record in done_records:
+        results.append(record)
+        stats.update(record)
+    print(f"Wznawiam sesję {exp_info['timestamp_start']} (konfiguracja: {config_file}, "
+          f"zapisane próby: {len(done_records)})")
+
+
+def simulated_exp_info(participant_id):
+    return {
+        'ID badanego': participant_id,
+        'ID badacza': 'symulacja',
+        'Wiek': '',
+        'Płeć': 'Nie chcę podawać',
+        'System telefonu': 'Inny',
+        'Ręczność': 'Praworęczny',
+        'Korekta wzroku': 'Brak',
+        'Uwagi': 'symulowany badany (--headless)'
+    }
 
 
 # ==================== DIALOG INFO O BADANYM ====================
-while True:
+resumed = None
+
+while not HEADLESS:
     exp_info = {
         'ID badanego': '',
         'ID badacza': '',
@@ -332,24 +1132,64 @@ while True:
         'Korekta wzroku': ['Brak', 'Okulary', 'Soczewki'],
         'Uwagi': ''
     }
-    dlg = gui.DlgFromDict(dictionary=exp_info, title='Eksperyment - Przeszukiwanie Sceny Wzrokowej')
+    dlg = gui.DlgFromDict(dictionary=exp_info, title='Eksperyment - Przeszukiwanie Sceny Wzrokowej',
+                          tip={'ID badanego': 'puste = kolejne wolne ID z rejestru'} if CFG['lab_mode'] else None)
     if not dlg.OK:
         core.quit()
 
+    if CFG['lab_mode']:
+        requested_id = exp_info['ID badanego'].strip()
+        unfinished = find_unfinished_journal(requested_id) if requested_id else None
+        if unfinished is not None:
+            header, done_records, _, _ = unfinished
+            resume_dlg = gui.Dlg(title='Niedokończona sesja')
+            resume_dlg.addText(f"Dla ID '{requested_id}' istnieje przerwana sesja "
+                               f"({header['exp_info']['timestamp_start']}, zapisanych prób: {len(done_records)}).")
+            resume_dlg.addText("OK = wznów sesję od kolejnej próby, Anuluj = podaj inne ID.")
+            resume_dlg.show()
+            if resume_dlg.OK:
+                resumed = unfinished
+                break
+            continue
+
+        allocation = allocate_participant(requested_id, CFG['lab_id_prefix'], CFG['wersja'])
+        if allocation is None:
+            warn_dlg = gui.Dlg(title='Uwaga!')
+            warn_dlg.addText(f"ID '{requested_id}' jest już przydzielone lub zapisane w rejestrze!")
+            warn_dlg.addText("Proszę podać inne ID albo zostawić pole puste.")
+            warn_dlg.show()
+            continue
+        exp_info['ID badanego'], CFG['wersja'] = allocation
+        print(f"Przydzielono ID {exp_info['ID badanego']}, wersja {CFG['wersja']}")
+        break
+
     if check_existing_id(exp_info['ID badanego']):
         warn_dlg = gui.Dlg(title='Uwaga!')
         warn_dlg.addText(f"ID '{exp_info['ID badanego']}' już istnieje w bazie danych!")
         warn_dlg.addText("Proszę podać inne ID.")
         warn_dlg.show()
-    else:
+        continue
+
+    unfinished = find_unfinished_journal(exp_info['ID badanego'])
+    if unfinished is None:
         break
 
-exp_info['data'] = datetime.now().strftime('%Y-%m-%d')
-exp_info['czas_rozpoczecia'] = datetime.now().strftime('%H:%M:%S')
-exp_info['timestamp_start'] = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-exp_info['config_file'] = config_file
-exp_info['config_nazwa'] = CFG['nazwa']
-exp_info['wersja'] = CFG['wersja']
+    header, done_records, _, _ = unfinished
+    resume_dlg = gui.Dlg(title='Niedokończona sesja')
+    resume_dlg.addText(f"Dla ID '{exp_info['ID badanego']}' istnieje przerwana sesja "
+                       f"({header['exp_info']['timestamp_start']}, zapisanych prób: {len(done_records)}).")
+    resume_dlg.addText("OK = wznów sesję od kolejnej próby, Anuluj = podaj inne ID.")
+    resume_dlg.show()
+    if resume_dlg.OK:
+        resumed = unfinished
+        break
+
+if HEADLESS:
+    SIM_BATCH = datetime.now().strftime('%Y%m%d%H%M%S')
+elif resumed is None:
+    start_session(exp_info)
+else:
+    resume_session(resumed)
 
 # ==================== PARAMETRY Z KONFIGURACJI ====================
 TARGETS = ['triangle', 'diamond']
@@ -367,20 +1207,56 @@ else:
     KEY_DIAMOND = 'a'
 
 # ==================== INICJALIZACJA OKNA ====================
-win = visual.Window(
-    size=[CFG['screen_width'], CFG['screen_height']],
-    fullscr=CFG['fullscreen'],
-    screen=0,
-    color=[0.2, 0.2, 0.2],
-    units='height',
-    allowGUI=not CFG['fullscreen']
-)
+if HEADLESS:
+    win = None
+else:
+    win = visual.Window(
+        size=[CFG['screen_width'], CFG['screen_height']],
+        fullscr=CFG['fullscreen'],
+        screen=0,
+        color=[0.2, 0.2, 0.2],
+        units='height',
+        allowGUI=not CFG['fullscreen']
+    )
+
+# ==================== SYNCHRONIZACJA Z ODŚWIEŻANIEM ====================
+# W trybie frame_locked kazda faza proby trwa okreslona liczbe odswiezen
+# ekranu (liczone flipy) zamiast core.wait, ktore dryfuje o ulamek klatki.
+BLANK_TIME = 0.2
+FRAME_RATE = None
+
+if CFG['frame_locked'] and not HEADLESS:
+    FRAME_RATE = win.getActualFrameRate(nIdentical=20, nMaxFrames=240,
+                                        nWarmUpFrames=20, threshold=1)
+    if FRAME_RATE is None:
+        FRAME_RATE = 60.0
+        print("UWAGA: nie udalo sie zmierzyc odswiezania ekranu, przyjmuje 60 Hz")
+    win.recordFrameIntervals = True
+    # zgubiona klatka = interwal dluzszy o 20% od nominalnego
+    win.refreshThreshold = 1.0 / FRAME_RATE * 1.2
+    print(f"Odświeżanie ekranu: {FRAME_RATE:.2f} Hz")
+
+def to_frames(seconds):
+    return max(1, int(round(seconds * FRAME_RATE)))
+
+PHASE_TIMES = {
+    'pusty_start': CFG['stimulus_time'],
+    'pusty':       BLANK_TIME,
+    'fiksacja':    CFG['fixation_time'],
+    'bodziec':     CFG['stimulus_time'],
+    'feedback':    CFG['feedback_time'],
+}
+PHASE_FRAMES = {phase: to_frames(t) for phase, t in PHASE_TIMES.items()} if FRAME_RATE else {}
+
+if FRAME_RATE:
+    print("Klatki faz: " + ", ".join(f"{k}={v}" for k, v in PHASE_FRAMES.items()))
 
 # ==================== SPRAWDZANIE IKON ====================
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-def resolve_icon_paths(file_list):
-    """Zamienia nazwy plikow na absolutne sciezki wzgledem katalogu skryptu."""
+def resolve_icon_paths(file_list, missing):
+    """Zamienia nazwy plikow na absolutne sciezki wzgledem katalogu skryptu;
+    brakujace pliki (z podpowiedzia najblizszej nazwy) dopisuje do missing."""
     resolved = []
     for f in file_list:
         f = f.strip()
@@ -390,12 +1266,24 @@ def resolve_icon_paths(file_list):
         if os.path.exists(path):
             resolved.append(path)
         else:
-            print(f"UWAGA: nie znaleziono ikony: {path}")
+            # literowki w nazwach (calendar.png / calenadr.png) wychodza przy starcie, nie w petli prob
+            folder = os.path.dirname(path)
+            available = os.listdir(folder) if os.path.isdir(folder) else []
+            hint = difflib.get_close_matches(os.path.basename(path), available, n=1)
+            suggestion = f" (czy chodziło o {hint[0]}?)" if hint else ""
+            missing.append(f"{path}{suggestion}")
     return resolved
 
-social_images  = resolve_icon_paths(CFG['social_apps'])
-neutral_images = resolve_icon_paths(CFG['neutral_apps'])
+# Brak ktorejkolwiek ikony z konfiguracji przerywa start - pominiecie jednej
+# rozstroiloby zbalansowanie ikon social i neutral miedzy probami.
+missing_icons = []
+social_images  = resolve_icon_paths(CFG['social_apps'], missing_icons)
+neutral_images = resolve_icon_paths(CFG['neutral_apps'], missing_icons)
 
+if missing_icons:
+    raise FileNotFoundError(
+        f"Nie znaleziono ikon z konfiguracji {config_file}:\n  " + "\n  ".join(missing_icons)
+    )
 if not social_images:
     raise FileNotFoundError(
         f"Brak ikon social w {os.path.join(SCRIPT_DIR, 'icons')}\n"
@@ -410,36 +1298,100 @@ if not neutral_images:
 print(f"Social icons ({len(social_images)}): {[os.path.basename(p) for p in social_images]}")
 print(f"Neutral icons ({len(neutral_images)}): {[os.path.basename(p) for p in neutral_images]}")
 
-def make_balanced_queue(image_list):
+def make_balanced_queue(image_list, rng=random):
     """Nieskonczona kolejka: kazda ikona pojawia sie tyle samo razy,
     kolejnosc w kazdym cyklu jest losowana."""
     def _gen():
         while True:
             shuffled = image_list[:]
-            random.shuffle(shuffled)
+            rng.shuffle(shuffled)
             yield from shuffled
     return _gen()
 
-social_queue  = make_balanced_queue(social_images)
-neutral_queue = make_balanced_queue(neutral_images)
+# ==================== KLAWIATURA ====================
+# backend = keyboard: psychopy.hardware.keyboard - czas wcisniecia z
+# urzadzenia (zdarzenie key-down), zegar zerowany na flipie z bodzcem.
+# backend = event (domyslnie / gdy keyboard niedostepny): event.waitKeys.
+KEYBOARD = None
 
-# ==================== BODŹCE ====================
-fixation = visual.ShapeStim(
-    win,
-    vertices='cross',
-    size=(0.05, 0.05),
-    lineColor='black',
-    fillColor='black',
-    lineWidth=0.1
-)
+if CFG['response_backend'] == 'keyboard' and not HEADLESS:
+    try:
+        from psychopy.hardware import keyboard
+        KEYBOARD = keyboard.Keyboard()
+    except Exception as e:
+        print(f"UWAGA: backend 'keyboard' niedostępny ({e}), używam 'event'")
+
+print(f"Odpowiedzi: backend {'keyboard' if KEYBOARD else 'event'}")
 
+# ==================== BODŹCE ====================
 ICON_SIZE = (CFG['icon_size'], CFG['icon_size'])
 
-app_icon = visual.ImageStim(
-    win,
-    size=ICON_SIZE,
-    pos=(0, 0),
-)
+# ==================== ATLAS IKON ====================
+# Ikony w icons/ sa pelnej rozdzielczosci, a na ekranie maja icon_size
+# wysokosci okna (~100 px). Przy starcie kazda ikona jest skalowana do
+# docelowego rozmiaru w pikselach i wszystkie sklejane w jeden plik atlasu
+# w data/atlas/. Atlas jest przebudowywany tylko, gdy zmieni sie lista ikon
+# z konfiguracji (pelne sciezki, w kolejnosci), rozmiar w pikselach albo data
+# modyfikacji ktoregos z plikow.
+ATLAS_DIR = os.path.join(SCRIPT_DIR, 'data', 'atlas')
+
+
+def icon_pixel_size():
+    """Bok ikony w pikselach dla biezacego okna (units='height')."""
+    return max(1, int(round(CFG['icon_size'] * win.size[1])))
+
+
+def atlas_key(image_paths, px):
+    """Skrot konfiguracji atlasu: rozmiar w pikselach + pelne sciezki i mtime plikow."""
+    h = hashlib.sha1(str(px).encode())
+    for path in image_paths:
+        h.update(f"|{os.path.abspath(path)}:{os.path.getmtime(path)}".encode())
+    return h.hexdigest()[:16]
+
+
+def build_icon_atlas(image_paths, px):
+    """Zwraca (obraz atlasu, {sciezka: kolumna}); z dysku albo budowany od nowa."""
+    from PIL import Image
+
+    key = atlas_key(image_paths, px)
+    atlas_path = os.path.join(ATLAS_DIR, f"atlas_{key}.png")
+    index = {path: i for i, path in enumerate(image_paths)}
+
+    if os.path.exists(atlas_path):
+        print(f"Atlas ikon z dysku: {atlas_path}")
+        return Image.open(atlas_path).convert('RGBA'), index
+
+    t0 = time.perf_counter()
+    atlas = Image.new('RGBA', (px * len(image_paths), px), (0, 0, 0, 0))
+    for path, i in index.items():
+        with Image.open(path) as img:
+            icon = img.convert('RGBA').resize((px, px), Image.LANCZOS)
+        atlas.paste(icon, (i * px, 0))
+
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    tmp_path = atlas_path + '.tmp'
+    atlas.save(tmp_path, format='PNG')
+    os.replace(tmp_path, atlas_path)
+    print(f"Zbudowano atlas ikon {px}x{px} px ({len(image_paths)} ikon) "
+          f"w {time.perf_counter() - t0:.2f} s: {atlas_path}")
+    return atlas, index
+
+
+def build_icon_cache(image_paths):
+    """Jeden ImageStim na ikone - PNG dekodowany i wysylany do GPU raz, przy starcie."""
+    unique = list(dict.fromkeys(image_paths))
+    cache = {}
+    if CFG['icon_atlas']:
+        px = icon_pixel_size()
+        atlas, index = build_icon_atlas(unique, px)
+        for path, i in index.items():
+            tile = atlas.crop((i * px, 0, (i + 1) * px, px))
+            cache[path] = visual.ImageStim(win, image=tile, size=ICON_SIZE, pos=(0, 0))
+        return cache
+    for path in unique:
+        cache[path] = visual.ImageStim(win, image=path, size=ICON_SIZE, pos=(0, 0))
+    return cache
+
 
 def create_shape(shape_type, size=None, color='white'):
     if size is None:
@@ -463,13 +1415,171 @@ def create_shape(shape_type, size=None, color='white'):
 
     return visual.ShapeStim(win, vertices=vertices, lineColor=color, fillColor=None, lineWidth=3)
 
-feedback_text = visual.TextStim(win, text='', height=0.05, color='white')
+
+# ==================== PULA BODŹCÓW ====================
+class StimulusPool:
+    """Pula gotowych ksztaltow budowana raz przy starcie okna.
+
+    Klucz to (typ ksztaltu, rozmiar, kolor); pod kazdym kluczem jest tyle
+    obiektow, ile moze pojawic sie naraz w jednej probie. W probie zmienia
+    sie tylko `pos`, wiec przygotowanie proby niczego nie alokuje.
+    """
+
+    def __init__(self, shape_types, colors, size, per_key):
+        self.stims = {}
+        self.in_use = {}
+        self.created = 0
+        self.reused = 0
+        for shape_type in shape_types:
+            for color in colors:
+                key = (shape_type, size, color)
+                self.stims[key] = [create_shape(shape_type, size=size, color=color)
+                                   for _ in range(per_key)]
+                self.created += per_key
+
+    def start_trial(self):
+        self.in_use = {}
+
+    def get(self, shape_type, color, size=None):
+        if size is None:
+            size = CFG['target_size']
+        key = (shape_type, size, color)
+        idx = self.in_use.get(key, 0)
+        self.in_use[key] = idx + 1
+        stims = self.stims.setdefault(key, [])
+        if idx < len(stims):
+            self.reused += 1
+        else:
+            # ksztalt spoza puli - dobudowany raz i zapamietany na kolejne proby
+            stims.append(create_shape(shape_type, size=size, color=color))
+            self.created += 1
+        return stims[idx]
+
+    def report(self):
+        return f"utworzono {self.created}, ponownie uzyto {self.reused}"
+
+
+POOL_COLORS = AVAILABLE_COLORS[:CFG['n_shapes']] if CFG['use_colors'] else ['white']
+
+if HEADLESS:
+    fixation = feedback_text = stimulus_pool = None
+    icon_cache = {}
+else:
+    fixation = visual.ShapeStim(
+        win,
+        vertices='cross',
+        size=(0.05, 0.05),
+        lineColor='black',
+        fillColor='black',
+        lineWidth=0.1
+    )
+
+    icon_cache = build_icon_cache(social_images + neutral_images)
+    print(f"Wczytano tekstury ikon: {len(icon_cache)}")
+
+    stimulus_pool = StimulusPool(TARGETS + DISTRACTORS, POOL_COLORS,
+                                 size=CFG['target_size'], per_key=CFG['n_shapes'])
+    print(f"Pula bodźców: {stimulus_pool.report()}")
+
+    feedback_text = visual.TextStim(win, text='', height=0.05, color='white')
+
+
+def draw_all(stims):
+    """Rysuje bodzce; zwraca czas samych wywolan draw() w sekundach."""
+    t0 = core.monotonicClock.getTime()
+    for stim in stims:
+        stim.draw()
+    return core.monotonicClock.getTime() - t0
+
+
+def present_phase(stims, phase):
+    """Pokazuje bodzce przez czas fazy.
+
+    Zwraca (czas pierwszego flipa fazy, czas rysowania przed tym flipem).
+    W trybie frame_locked faza to dokladnie PHASE_FRAMES[phase] flipow,
+    w przeciwnym razie jeden flip i core.wait.
+    """
+    if not FRAME_RATE:
+        draw_time = draw_all(stims)
+        onset = win.flip()
+        core.wait(PHASE_TIMES[phase])
+        return onset, draw_time
+
+    onset = draw_time = None
+    for _ in range(PHASE_FRAMES[phase]):
+        frame_draw_time = draw_all(stims)
+        flip_time = win.flip()
+        if onset is None:
+            onset, draw_time = flip_time, frame_draw_time
+    return onset, draw_time
+
+
+# ==================== TRYB CZASU RZECZYWISTEGO ====================
+# Od fiksacji do zebrania odpowiedzi: wylaczony garbage collector i
+# podniesiony priorytet procesu (core.rush). Zbieranie smieci odbywa sie
+# jawnie w przerwie (feedback / miedzy probami) i jego czas trafia do
+# rekordu proby. Przestoje planisty (interwal klatki dluzszy od nominalnego
+# o prog_pauzy_ms) mierzone sa tylko z frame_locked - bez niego fazy trwaja
+# core.wait i interwal miedzy flipami to czas fazy, a nie przestoj.
+def enter_critical():
+    """Poczatek okna krytycznego; zwraca znacznik do leave_critical."""
+    if not CFG['realtime']:
+        return None
+    gc.disable()
+    core.rush(True)
+    return len(win.frameIntervals) if FRAME_RATE else -1
+
+
+def leave_critical(mark):
+    """Koniec okna krytycznego; zwraca pomiary przestojow do rekordu proby."""
+    if mark is None:
+        return {}
+    core.rush(False)
+    gc.enable()
+    if mark < 0:
+        return {'przerwy_planisty': '', 'max_przerwa_ms': ''}
+    nominal_ms = 1000.0 / FRAME_RATE
+    excess = [i * 1000 - nominal_ms for i in win.frameIntervals[mark:]]
+    excess = [e for e in excess if e > CFG['pause_threshold_ms']]
+    return {
+        'przerwy_planisty': len(excess),
+        'max_przerwa_ms':   round(max(excess), 3) if excess else 0.0,
+    }
+
+
+def collect_garbage():
+    """Jawne zbieranie smieci w przerwie; zwraca czas w ms ('' poza trybem czasu rzeczywistego)."""
+    if not CFG['realtime'] or HEADLESS:
+        return ''
+    t0 = time.perf_counter()
+    gc.collect()
+    return round((time.perf_counter() - t0) * 1000, 3)
+
+
+# ==================== RYSOWANIE PLANSZY ====================
+# rysowanie = bufor: ksztalty i ikona skladane przed proba w jeden
+# BufferImageStim, wiec przed flipem z bodzcem jest jedno draw() niezaleznie
+# od liczby ksztaltow i kolorow. rysowanie = osobno: kazdy bodziec osobno.
+def search_array_rect():
+    """Prostokat (norm) obejmujacy plansze - przechwytywany jest tylko ten fragment ekranu.
+    Proporcje z rzeczywistego rozmiaru okna: przy fullscreen PsychoPy bierze
+    rozdzielczosc monitora, nie screen_width x screen_height z konfiguracji."""
+    extent = CFG['radius'] + max(CFG['target_size'], CFG['icon_size'])
+    width, height = win.size
+    half_w = min(1.0, extent * 2 * height / width)
+    half_h = min(1.0, extent * 2)
+    return [-half_w, half_h, half_w, -half_h]
+
+
+def compose_search_array(stims):
+    """Sklada bodzce w jeden BufferImageStim (rysuje do tylnego bufora, kopiuje, czysci)."""
+    return visual.BufferImageStim(win, buffer='back', rect=search_array_rect(), stim=stims)
 
 
 
 # ==================== TWORZENIE LISTY PRÓB ====================
 
-def create_trial_list():
+def create_trial_list(rng=random):
     """
     Tworzy 320 prob podzielonych na 4 bloki po 80 prob.
     W kazdym bloku sa rowno 20 prob z kazdego z 4 warunkow
@@ -495,13 +1605,13 @@ def create_trial_list():
                             'load': load,
                             'icon_type': icon_type
                         })
-        random.shuffle(block_trials)
+        rng.shuffle(block_trials)
         all_trials.extend(block_trials)
 
     return all_trials
 
 
-def create_training_list():
+def create_training_list(rng=random):
     n_per_condition = max(1, CFG['n_training_trials'] // 4)
     n_per_target = max(1, n_per_condition // 2)
     trials = []
@@ -510,77 +1620,108 @@ def create_training_list():
             for target in TARGETS:
                 for _ in range(n_per_target):
                     trials.append({'target': target, 'load': load, 'icon_type': icon_type})
-    random.shuffle(trials)
+    rng.shuffle(trials)
     return trials[:CFG['n_training_trials']]
 
 
-# ==================== FUNKCJA POJEDYNCZEJ PRÓBY ====================
+# ==================== PLAN SESJI ====================
 
-def run_trial(trial_params, trial_number, block_number, is_practice=False):
-    target_shape = trial_params['target']
-    load = trial_params.get('load', 'high')          # 'low' lub 'high'
-    icon_type = trial_params.get('icon_type', 'social')  # 'social' lub 'nonsocial'
+def compile_session_plan(cfg, seed):
+    """
+    Losuje z ziarna cala sesje przed pierwsza instrukcja: kolejnosc prob,
+    ikony, pozycje, ksztalty i kolory. Wynik to slownik tablic NumPy
+    (jeden wiersz = jedna proba: najpierw trening, potem bloki), wiec
+    run_trial tylko indeksuje plan, a sesje da sie odtworzyc co do proby.
+    """
+    rng = random.Random(seed)
+    training = create_training_list(rng)
+    experimental = create_trial_list(rng)
+    trials = training + experimental
+    n_trials = len(trials)
+    n_shapes = cfg['n_shapes']
+    trials_per_block = max(1, len(experimental) // cfg['n_blocks'])
+
+    social_queue = make_balanced_queue(social_images, rng)
+    neutral_queue = make_balanced_queue(neutral_images, rng)
+
+    icons, target_idx, angle_offset, shapes, colors = [], [], [], [], []
+    for params in trials:
+        target_shape = params['target']
+        icons.append(next(social_queue) if params['icon_type'] == 'social' else next(neutral_queue))
+        angle_offset.append(rng.random() * 360)
+        target = rng.randint(0, n_shapes - 1)
+        target_idx.append(target)
+
+        if cfg['use_colors']:
+            shape_colors = AVAILABLE_COLORS[:n_shapes]
+            rng.shuffle(shape_colors)
+        else:
+            shape_colors = ['white'] * n_shapes
 
-    # --- Liczba kształtów ---
-    # Niskie obciążenie: 3 kształty (1 target + 2 dystraktory)
-    # Wysokie obciążenie: 6 kształtów (1 target + 5 dystraktorów)
-    n_shapes = CFG['n_shapes']  # stala liczba figur niezaleznie od warunku
+        if params['load'] == 'low':
+            # LL: wszystkie dystraktory sa kolami
+            distractors_for_trial = ['circle'] * (n_shapes - 1)
+        else:
+            # HL: wszystkie ksztalty rozne (target + kazdy dystraktor unikalny)
+            available_distractors = [d for d in DISTRACTORS if d != target_shape]
+            rng.shuffle(available_distractors)
+            distractors_for_trial = (available_distractors * 2)[:n_shapes - 1]
+        distractors_for_trial.insert(target, target_shape)
 
-    # --- Dobór ikony ---
-    icon_filename = None
+        shapes.append(distractors_for_trial)
+        colors.append(shape_colors)
 
-    if icon_type == 'social':
-        icon_filename = next(social_queue)
-    else:
-        icon_filename = next(neutral_queue)
-    app_icon.image = icon_filename
+    # pozycje wszystkich ksztaltow naraz: (proba, ksztalt, xy)
+    angle_offset = np.array(angle_offset)
+    rad = np.deg2rad(linspace(0, 360, n_shapes, endpoint=False)[None, :] + angle_offset[:, None])
+    positions = np.stack([cfg['radius'] * np.cos(rad), cfg['radius'] * np.sin(rad)], axis=-1)
 
-    # Pozycja ikony (zawsze centrum)
-    app_icon.pos = (0, 0)
+    is_practice = np.array([1] * len(training) + [0] * len(experimental), dtype=np.int8)
+    exp_idx = np.arange(len(experimental))
+    trial_number = np.concatenate([np.arange(1, len(training) + 1), exp_idx + 1])
+    block_number = np.concatenate([np.zeros(len(training), dtype=int), exp_idx // trials_per_block + 1])
 
+    return {
+        'czy_trening':    is_practice,
+        'numer_proby':    trial_number.astype(np.int32),
+        'numer_bloku':    block_number.astype(np.int32),
+        'target':         np.array([t['target'] for t in trials]),
+        'load':           np.array([t['load'] for t in trials]),
+        'icon_type':      np.array([t['icon_type'] for t in trials]),
+        'ikona':          np.array(icons),
+        'target_pozycja': np.array(target_idx, dtype=np.int32),
+        'kat_przesuniecia': angle_offset,
+        'ksztalty':       np.array(shapes).reshape(n_trials, n_shapes),
+        'kolory':         np.array(colors).reshape(n_trials, n_shapes),
+        'pozycje':        positions,
+    }
 
-    # --- Generowanie kształtów ---
-    angles = linspace(0, 360, n_shapes, endpoint=False)
-    angle_offset = random.random() * 360
-    target_idx = random.randint(0, n_shapes - 1)
-    n_distractors = n_shapes - 1
 
-    if CFG['use_colors']:
-        shape_colors = AVAILABLE_COLORS[:n_shapes]
-        random.shuffle(shape_colors)
-    else:
-        shape_colors = ['white'] * n_shapes
+def save_plan(plan):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    filename = os.path.join(RESULTS_DIR, f"plan_{exp_info['ID badanego']}_{exp_info['timestamp_start']}.npz")
+    np.savez_compressed(filename, seed=SESSION_SEED, **plan)
+    print(f"Plan sesji zapisany: {filename}")
 
-    shapes_data = []
-    colors_data = []
 
-    if load == 'low':
-        # LL: wszystkie dystraktory sa kolami
-        distractors_for_trial = ['circle'] * n_distractors
-    else:
-        # HL: wszystkie ksztalty rozne (target + kazdy dystraktor unikalny)
-        available_distractors = [d for d in DISTRACTORS if d != target_shape]
-        random.shuffle(available_distractors)
-        distractors_for_trial = (available_distractors * 2)[:n_distractors]
+# ==================== FUNKCJA POJEDYNCZEJ PRÓBY ====================
 
-    trial_shapes = []
-    distractor_idx = 0
-    for i in range(n_shapes):
-        rad = deg2rad(angles[i] + angle_offset)
-        x = CFG['radius'] * cos(rad)
-        y = CFG['radius'] * sin(rad)
-
-        if i == target_idx:
-            shape = create_shape(target_shape, color=shape_colors[i])
-            shapes_data.append(target_shape)
-        else:
-            shape = create_shape(distractors_for_trial[distractor_idx], color=shape_colors[i])
-            shapes_data.append(distractors_for_trial[distractor_idx])
-            distractor_idx += 1
+def run_trial(row, next_row=None):
+    target_shape = str(PLAN['target'][row])
+    load = str(PLAN['load'][row])                # 'low' lub 'high'
+    icon_type = str(PLAN['icon_type'][row])      # 'social' lub 'neutral'
+    trial_number = int(PLAN['numer_proby'][row])
+    block_number = int(PLAN['numer_bloku'][row])
+    is_practice = bool(PLAN['czy_trening'][row])
 
-        shape.pos = (x, y)
-        colors_data.append(shape_colors[i])
-        trial_shapes.append(shape)
+    # --- Liczba kształtów ---
+    n_shapes = CFG['n_shapes']  # stala liczba figur niezaleznie od warunku
+
+    # --- Ikona i kształty z planu sesji ---
+    icon_filename = str(PLAN['ikona'][row])
+    target_idx = int(PLAN['target_pozycja'][row])
+    shapes_data = PLAN['ksztalty'][row].tolist()
+    colors_data = PLAN['kolory'][row].tolist()
 
     # --- Poprawny klawisz ---
     # Wersja A: klawisz A = trójkąt, klawisz L = romb
@@ -590,46 +1731,12 @@ def run_trial(trial_params, trial_number, block_number, is_practice=False):
     else:
         correct_key = KEY_DIAMOND
 
-    # --- Fiksacja ---
-    win.flip()
-
-    timer = core.Clock()
-    core.wait(CFG['stimulus_time'])
-
-    # --- Pusty ekran po planszy ---
-    win.flip()
-    core.wait(0.2)
-
-    # --- Fiksacja ---
-    fixation.draw()
-    win.flip()
-    core.wait(CFG['fixation_time'])
-
-    # --- Ekspozycja bodźców ---
-    for shape in trial_shapes:
-        shape.draw()
-    app_icon.draw()
-    win.flip()
-    timer = core.Clock()
-    core.wait(CFG['stimulus_time'])
-
-    # --- Pusta po ekspozycji ---
-    win.flip()
-
-    response = None
-    rt = None
-
-    keys = event.waitKeys(
-        maxWait=CFG['max_response_time'] - CFG['stimulus_time'],
-        keyList=['a', 'l', 'escape'],
-        timeStamped=timer
-    )
-
-    if keys:
-        if 'escape' in keys[0]:
-            save_and_quit()
-        response = keys[0][0]
-        rt = keys[0][1]
+    load_cond = 'LL' if load == 'low' else 'HL'
+    if HEADLESS:
+        response, rt = simulate_response(load_cond, icon_type, correct_key)
+        timing = empty_timing()
+    else:
+        response, rt, timing = present_trial(row)
 
     if response:
         correct = (response == correct_key)
@@ -652,16 +1759,31 @@ def run_trial(trial_params, trial_number, block_number, is_practice=False):
         feedback_msg = "Za wolno!"
         feedback_color = 'yellow'
 
-    if CFG['show_feedback']:
+    if CFG['show_feedback'] and not HEADLESS:
         feedback_text.text = feedback_msg
         feedback_text.color = feedback_color
-        feedback_text.draw()
-        win.flip()
+        if FRAME_RATE:
+            # feedback widoczny co najmniej feedback_time, potem czeka na spacje
+            present_phase([feedback_text], 'feedback')
+        else:
+            feedback_text.draw()
+            win.flip()
+
+        # plansza nastepnej proby skladana, gdy na ekranie jest feedback
+        prerender_trial(next_row)
+        gc_time = collect_garbage()
 
         keys = event.waitKeys(keyList=['space', 'escape'])
         if 'escape' in keys:
             save_and_quit()
-            
+    elif not HEADLESS:
+        prerender_trial(next_row)
+        gc_time = collect_garbage()
+    else:
+        gc_time = ''
+    if CFG['realtime']:
+        timing['gc_zbieranie_ms'] = gc_time
+
     def safe_get(lst, idx):
         return lst[idx] if idx < len(lst) else ''
 
@@ -671,7 +1793,7 @@ def run_trial(trial_params, trial_number, block_number, is_practice=False):
         'numer_proby':      trial_number,
         'numer_bloku':      block_number,
         'czy_trening':      1 if is_practice else 0,
-        'load_condition':   'LL' if load == 'low' else 'HL',
+        'load_condition':   load_cond,
         'icon_category':    icon_type,           # 'social' lub 'nonsocial'
         'target':           target_shape,
         'ikona':            os.path.basename(icon_filename) if icon_filename else '',
@@ -686,121 +1808,593 @@ def run_trial(trial_params, trial_number, block_number, is_practice=False):
         'odpowiedz':        response if response else '',
         'poprawna_odpowiedz': correct_key,
         'czy_poprawna':     1 if correct else (0 if correct is not None else ''),
-        'czas_reakcji_ms':  round(rt * 1000, 2) if rt else ''
+        'czas_reakcji_ms':  round(rt * 1000, 2) if rt else '',
+        **timing
     }
 
 
+def search_array_stims(row):
+    """Bodzce planszy z wiersza planu: ksztalty z puli na swoich pozycjach + ikona."""
+    # Gotowa tekstura z cache - bez czytania pliku w przerwie miedzy probami
+    app_icon = icon_cache[str(PLAN['ikona'][row])]
+    positions = PLAN['pozycje'][row]
+
+    trial_shapes = []
+    stimulus_pool.start_trial()
+    for i, (shape_type, color) in enumerate(zip(PLAN['ksztalty'][row], PLAN['kolory'][row])):
+        shape = stimulus_pool.get(str(shape_type), str(color))
+        shape.pos = positions[i]
+        trial_shapes.append(shape)
+    return trial_shapes + [app_icon]
+
+
+# Plansze zlozone z wyprzedzeniem: {wiersz planu: (BufferImageStim, czas skladania ms)}
+prerendered = {}
+
+
+def prerender_trial(row):
+    """Sklada plansze kolejnej proby poza ekranem (w czasie feedbacku/przerwy biezacej)."""
+    if not CFG['prerender'] or row is None or row >= len(PLAN['target']):
+        return
+    prerendered.clear()
+    t0 = core.monotonicClock.getTime()
+    composite = compose_search_array(search_array_stims(row))
+    prerendered[row] = (composite, round((core.monotonicClock.getTime() - t0) * 1000, 3))
+
+
+def present_trial(row):
+    """Pokazuje jedna probe z planu i zbiera odpowiedz: (klawisz, rt w s, pomiary czasu)."""
+    compose_time = ''
+    was_prerendered = 0
+    if row in prerendered:
+        composite, compose_time = prerendered.pop(row)
+        stimulus_stims = [composite]
+        was_prerendered = 1
+    elif CFG['render_mode'] == 'bufor' or CFG['prerender']:
+        t0 = core.monotonicClock.getTime()
+        stimulus_stims = [compose_search_array(search_array_stims(row))]
+        compose_time = round((core.monotonicClock.getTime() - t0) * 1000, 3)
+    else:
+        stimulus_stims = search_array_stims(row)
+
+    # --- Pusty ekran przed proba ---
+    t_blank_start, _ = present_phase([], 'pusty_start')
+
+    # --- Pusty ekran po planszy ---
+    t_blank, _ = present_phase([], 'pusty')
+
+    # --- Fiksacja ---
+    critical = enter_critical()
+    t_fixation, _ = present_phase([fixation], 'fiksacja')
+
+    # --- Ekspozycja bodźców ---
+    # zegar RT zerowany dokladnie w momencie flipa z bodzcem
+    timer = core.Clock()
+    clock_reset = {}
+
+    def reset_rt_clock():
+        timer.reset()
+        if KEYBOARD:
+            KEYBOARD.clock.reset()
+            KEYBOARD.clearEvents()
+        clock_reset['t'] = core.monotonicClock.getTime()
+
+    dropped_before = win.nDroppedFrames if FRAME_RATE else None
+    win.callOnFlip(reset_rt_clock)
+    stimulus_onset, draw_time = present_phase(stimulus_stims, 'bodziec')
+
+    # --- Pusta po ekspozycji ---
+    stimulus_offset = win.flip()
+    stimulus_measured_ms = round((stimulus_offset - stimulus_onset) * 1000, 2)
+    dropped_frames = win.nDroppedFrames - dropped_before if FRAME_RATE else ''
+
+    response = None
+    rt = None
+
+    t_response_start = core.monotonicClock.getTime()
+    keys = wait_response(timer)
+    pauses = leave_critical(critical)
+
+    if keys:
+        if 'escape' in keys[0]:
+            save_and_quit()
+        response = keys[0][0]
+        rt = keys[0][1]
+
+    timing = {
+        'bodziec_zmierzony_ms': stimulus_measured_ms,
+        'zgubione_klatki':      dropped_frames,
+        'czas_rysowania_ms':    round(draw_time * 1000, 3),
+        'czas_kompozycji_ms':   compose_time,
+        'prerender':            was_prerendered,
+    }
+    if CFG['instrumentacja']:
+        def ms(t):
+            return round(t * 1000, 2)
+        timing.update({
+            't_pusty_start_s':     round(t_blank_start, 5),
+            't_pusty_s':           round(t_blank, 5),
+            't_fiksacja_s':        round(t_fixation, 5),
+            't_bodziec_on_s':      round(stimulus_onset, 5),
+            't_bodziec_off_s':     round(stimulus_offset, 5),
+            't_odpowiedz_start_s': round(t_response_start, 5),
+            'pusty_zmierzony_ms':  ms(t_fixation - t_blank),
+            'fiksacja_zmierzona_ms': ms(stimulus_onset - t_fixation),
+            'opoznienie_zegara_rt_ms': ms(clock_reset['t'] - stimulus_onset),
+            'start_odpowiedzi_ms': ms(t_response_start - stimulus_offset),
+        })
+    timing.update(pauses)
+    return response, rt, {k: v for k, v in timing.items() if k in TIMING_COLUMNS}
+
+
+# Kolumny z pomiarami czasu w pliku wynikow - tylko dla wlaczonych opcji
+# prezentacji, wiec przy domyslnej konfiguracji uklad pliku jest taki jak
+# przed ich wprowadzeniem (instrumentacja: [POMIAR])
+TIMING_COLUMNS = []
+if CFG['frame_locked'] or CFG['instrumentacja']:
+    TIMING_COLUMNS += ['bodziec_zmierzony_ms', 'zgubione_klatki']
+if CFG['render_mode'] == 'bufor' or CFG['prerender'] or CFG['instrumentacja']:
+    TIMING_COLUMNS += ['czas_rysowania_ms', 'czas_kompozycji_ms', 'prerender']
+if CFG['instrumentacja']:
+    TIMING_COLUMNS += ['t_pusty_start_s', 't_pusty_s', 't_fiksacja_s', 't_bodziec_on_s',
+                       't_bodziec_off_s', 't_odpowiedz_start_s', 'pusty_zmierzony_ms',
+                       'fiksacja_zmierzona_ms', 'opoznienie_zegara_rt_ms', 'start_odpowiedzi_ms']
+if CFG['realtime']:
+    TIMING_COLUMNS += ['przerwy_planisty', 'max_przerwa_ms', 'gc_zbieranie_ms']
+
+
+def wait_response(timer):
+    """Czeka na odpowiedz; zwraca [(klawisz, rt w s)] jak event.waitKeys(timeStamped=...)."""
+    max_wait = CFG['max_response_time'] - CFG['stimulus_time']
+    if KEYBOARD:
+        # rt liczony od flipa z bodzcem do zdarzenia key-down z urzadzenia,
+        # a nie do momentu odpytania kolejki
+        presses = KEYBOARD.waitKeys(maxWait=max_wait, keyList=['a', 'l', 'escape'],
+                                    waitRelease=False)
+        return [(press.name, press.rt) for press in presses] if presses else None
+    return event.waitKeys(
+        maxWait=max_wait,
+        keyList=['a', 'l', 'escape'],
+        timeStamped=timer
+    )
+
+
+def empty_timing():
+    """Te same kolumny pomiarow co w present_trial, puste (tryb --headless)."""
+    return dict.fromkeys(TIMING_COLUMNS, '')
+
+
+def simulate_response(load_cond, icon_cat, correct_key):
+    """Symulowany badany: RT z rozkladu ex-Gaussa, poprawnosc z p = accuracy."""
+    params = CFG['symulacja'][(load_cond, icon_cat)]
+    if sim_rng.random() < params['brak_odpowiedzi']:
+        return None, None
+    rt_ms = sim_rng.normal(params['rt_mu'], params['rt_sigma']) + sim_rng.exponential(params['rt_tau'])
+    rt = max(rt_ms, 1.0) / 1000
+    if rt > CFG['max_response_time']:
+        return None, None
+    if sim_rng.random() < params['accuracy']:
+        return correct_key, rt
+    return (KEY_DIAMOND if correct_key == KEY_TRIANGLE else KEY_TRIANGLE), rt
+
+
+# ==================== KALIBRACJA STANOWISKA ====================
+# Przed pierwsza instrukcja: interwal klatki na pustym ekranie, rozklad
+# interwalow z narysowana najciezsza plansza (HL) i koszt odpytania klawiatury.
+# Wynik trafia do podsumowania i do data/calibration/ (ostatni pomiar per
+# stanowisko i rozdzielczosc - podsumowanie pokazuje zmiane od poprzedniego).
+CALIBRATION_DIR = os.path.join(DATA_DIR, 'calibration')
+CALIBRATION = None
+
+
+def calibration_cache_path():
+    return os.path.join(CALIBRATION_DIR, f"kalibracja_{platform.node() or 'stanowisko'}.json")
+
+
+def flip_intervals(stims, n_flips):
+    """Interwaly (ms) miedzy n_flips kolejnymi flipami z narysowanymi stims."""
+    timestamps = []
+    for _ in range(n_flips + 1):
+        for stim in stims:
+            stim.draw()
+        timestamps.append(win.flip())
+    return np.diff(timestamps) * 1000
+
+
+def interval_stats(intervals, period_ms):
+    return {
+        'srednia_ms': round(float(intervals.mean()), 3),
+        'sd_ms':      round(float(intervals.std()), 3),
+        'p95_ms':     round(float(np.percentile(intervals, 95)), 3),
+        'max_ms':     round(float(intervals.max()), 3),
+        'zgubione':   int((intervals > period_ms * 1.5).sum()),
+    }
+
+
+def keyboard_poll_overhead(n_polls=200):
+    """Sredni i maksymalny czas (ms) jednego odpytania backendu odpowiedzi."""
+    durations = []
+    for _ in range(n_polls):
+        t0 = time.perf_counter()
+        if KEYBOARD:
+            KEYBOARD.getKeys(keyList=['a', 'l', 'escape'], waitRelease=False, clear=False)
+        else:
+            event.getKeys(keyList=['a', 'l', 'escape'])
+        durations.append(time.perf_counter() - t0)
+    durations = np.array(durations) * 1000
+    return {'srednia_ms': round(float(durations.mean()), 4), 'max_ms': round(float(durations.max()), 4)}
+
+
+def calibrate():
+    """Pomiar czasow stanowiska; zwraca slownik z wynikiem i lista powodow odmowy."""
+    n_flips = CFG['calibration_flips']
+    blank = flip_intervals([], n_flips)
+    period_ms = float(np.median(blank))
+
+    # plansza HL rysowana (pelny koszt rysowania), ale zaslonieta nieprzezroczystym
+    # prostokatem w kolorze tla - badany nie widzi bodzcow zadnej z prob przed instrukcja
+    heavy_row = int(np.flatnonzero(PLAN['load'] == 'high')[0])
+    stims = search_array_stims(heavy_row)
+    if CFG['render_mode'] == 'bufor':
+        stims = [compose_search_array(stims)]
+    cover = visual.Rect(win, width=2, height=2, units='norm', fillColor=win.color,
+                        lineColor=win.color, colorSpace=win.colorSpace)
+    loaded = flip_intervals([fixation] + stims + [cover], n_flips)
+    win.flip()
+
+    stimulus_frames = int(round(CFG['stimulus_time'] * 1000 / period_ms))
+    stimulus_error_ms = abs(stimulus_frames * period_ms - CFG['stimulus_time'] * 1000)
+
+    result = {
+        'stanowisko':       platform.node(),
+        'data':             datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+        'rozdzielczosc':    [int(v) for v in win.size],
+        'pelny_ekran':      CFG['fullscreen'],
+        'odswiezanie_hz':   round(1000 / period_ms, 3),
+        'pusty':            interval_stats(blank, period_ms),
+        'plansza':          interval_stats(loaded, period_ms),
+        'klawiatura':       keyboard_poll_overhead(),
+        'backend':          'keyboard' if KEYBOARD else 'event',
+        'bodziec_klatki':   stimulus_frames,
+        'bodziec_blad_ms':  round(stimulus_error_ms, 3),
+    }
+
+    problems = []
+    if stimulus_frames < 1:
+        problems.append(f"czas bodźca {CFG['stimulus_time'] * 1000:.0f} ms krótszy niż klatka ({period_ms:.2f} ms)")
+    elif stimulus_error_ms > CFG['calibration_tolerance_ms']:
+        problems.append(f"czas bodźca {CFG['stimulus_time'] * 1000:.0f} ms nie jest wielokrotnością klatki "
+                        f"({stimulus_frames} x {period_ms:.2f} ms, błąd {stimulus_error_ms:.2f} ms)")
+    dropped_fraction = result['plansza']['zgubione'] / n_flips
+    if dropped_fraction > CFG['calibration_max_dropped']:
+        problems.append(f"zgubione klatki z planszą: {result['plansza']['zgubione']} z {n_flips} "
+                        f"(limit {CFG['calibration_max_dropped'] * 100:.1f}%)")
+    result['problemy'] = problems
+
+    cache_path = calibration_cache_path()
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding='utf-8') as f:
+            cache = json.load(f)
+    screen_key = f"{result['rozdzielczosc'][0]}x{result['rozdzielczosc'][1]}{'_pelny' if CFG['fullscreen'] else ''}"
+    result['poprzednia'] = cache.get(screen_key)
+    cache[screen_key] = {k: v for k, v in result.items() if k != 'poprzednia'}
+    os.makedirs(CALIBRATION_DIR, exist_ok=True)
+    writer.submit(write_json, cache_path, cache, description=cache_path)
+    return result
+
+
+def calibration_lines(calibration):
+    """Linie sekcji KALIBRACJA w podsumowaniu."""
+    blank, loaded, keys = calibration['pusty'], calibration['plansza'], calibration['klawiatura']
+    lines = [
+        f"Stanowisko: {calibration['stanowisko']} ({calibration['rozdzielczosc'][0]}x"
+        f"{calibration['rozdzielczosc'][1]})",
+        f"Odświeżanie: {calibration['odswiezanie_hz']:.2f} Hz",
+        f"Interwał klatki (pusty ekran): śr. {blank['srednia_ms']:.3f} ms, SD {blank['sd_ms']:.3f}, "
+        f"p95 {blank['p95_ms']:.3f}, max {blank['max_ms']:.3f}, zgubione {blank['zgubione']}",
+        f"Interwał klatki (plansza HL): śr. {loaded['srednia_ms']:.3f} ms, SD {loaded['sd_ms']:.3f}, "
+        f"p95 {loaded['p95_ms']:.3f}, max {loaded['max_ms']:.3f}, zgubione {loaded['zgubione']}",
+        f"Odpytanie klawiatury ({calibration['backend']}): śr. {keys['srednia_ms']:.4f} ms, "
+        f"max {keys['max_ms']:.4f} ms",
+        f"Bodziec: {calibration['bodziec_klatki']} klatek (błąd {calibration['bodziec_blad_ms']:.2f} ms)",
+    ]
+    previous = calibration.get('poprzednia')
+    if previous:
+        lines.append(f"Poprzednia kalibracja ({previous['data']}): {previous['odswiezanie_hz']:.2f} Hz, "
+                     f"SD z planszą {previous['plansza']['sd_ms']:.3f} ms")
+    for problem in calibration['problemy']:
+        lines.append(f"PROBLEM: {problem}")
+    return lines
+
+
 # ==================== ZAPIS DANYCH ====================
-results = []
+def record_result(result):
+    results.append(result)
+    stats.update(result)
+    # dopisanie do dziennika (z fsync) synchronicznie - twarda awaria nie traci
+    # prob czekajacych w kolejce zapisu; watek zapisu zamyka tylko dziennik
+    journal.append(result)
+
+
+JITTER_BINS_MS = [-8, -4, -2, -1, 1, 2, 4, 8, 17]
+
+
+def jitter_histogram(store, column, nominal_ms, label):
+    """Tekstowy histogram odchylen zmierzonego czasu fazy od czasu nominalnego."""
+    if column not in store.kinds:
+        return [f"{label}: brak pomiarów"]
+    values = store.column(column)
+    deviations = values[~np.isnan(values)] - nominal_ms
+    if not len(deviations):
+        return [f"{label}: brak pomiarów"]
+
+    edges = [float('-inf')] + JITTER_BINS_MS + [float('inf')]
+    counts = np.histogram(deviations, bins=edges)[0].tolist()
+
+    lines = [f"{label}: n={len(deviations)}, nominalnie {nominal_ms:.0f} ms, "
+             f"śr. odchylenie={deviations.mean():+.2f} ms, "
+             f"min={deviations.min():+.2f}, max={deviations.max():+.2f}"]
+    scale = max(counts)
+    for i, count in enumerate(counts):
+        low = '-inf' if i == 0 else f"{edges[i]:+g}"
+        high = '+inf' if i == len(counts) - 1 else f"{edges[i + 1]:+g}"
+        bar = '#' * int(round(40 * count / scale)) if scale else ''
+        lines.append(f"  [{low:>5}, {high:>5}) ms {count:>5} {bar}")
+    return lines
+
+
+COLUMNAR_FORMATS = {'parquet': '.parquet', 'feather': '.feather', 'npz': '.npz'}
+
+
+def session_metadata():
+    """Metryczka sesji i konfiguracja zapisywane w pliku kolumnowym."""
+    cfg = {k: v for k, v in CFG.items() if k != 'symulacja'}
+    cfg['symulacja'] = {f"{load}_{icon}": params for (load, icon), params in CFG['symulacja'].items()}
+    return {
+        'exp_info': exp_info,
+        'config': cfg,
+        'config_file': config_file,
+        'seed': SESSION_SEED,
+        'frame_rate': FRAME_RATE,
+        'brak_int': int(MISSING_INT),
+    }
+
+
+def save_columnar(base_filename, store, fmt, metadata):
+    """Wyniki z typami kolumn obok CSV: int dla numerow, float z NaN dla czasow,
+    kategorie dla warunkow; metryczka sesji w metadanych pliku."""
+    typed = store.typed_columns()
+
+    if fmt in ('parquet', 'feather'):
+        try:
+            import pyarrow as pa
+            import pyarrow.feather
+            import pyarrow.parquet
+        except ImportError as e:
+            print(f"UWAGA: format '{fmt}' niedostępny ({e}), zapisuję npz")
+            fmt = 'npz'
+
+    filename = base_filename + COLUMNAR_FORMATS[fmt]
+    if fmt == 'npz':
+        arrays = {'__meta__': np.array(metadata)}
+        for name, (values, _, categories) in typed.items():
+            arrays[name] = values
+            if categories is not None:
+                arrays[f'__kategorie__{name}'] = np.array(categories, dtype=str)
+        np.savez_compressed(filename, **arrays)
+    else:
+        fields = {}
+        for name, (values, missing, categories) in typed.items():
+            if categories is not None:
+                indices = pa.array(values, mask=missing, type=pa.int16())
+                fields[name] = pa.DictionaryArray.from_arrays(indices, pa.array(categories, type=pa.string()))
+            else:
+                fields[name] = pa.array(values, mask=missing)
+        table = pa.table(fields).replace_schema_metadata({'uwaga': metadata})
+        if fmt == 'parquet':
+            pyarrow.parquet.write_table(table, filename)
+        else:
+            pyarrow.feather.write_feather(table, filename)
+    print(f"Wyniki kolumnowe zapisane: {filename}")
+
+
+def write_csv(filename, store):
+    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+        csv_writer = csv.writer(f, delimiter=';')
+        csv_writer.writerow(store.columns)
+        csv_writer.writerows(store.rows())
+    print(f"Wyniki zapisane: {filename}")
+
+
+def write_json(filename, data):
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_filename, filename)
+
+
+def write_text(filename, text):
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(text)
+    print(f"Podsumowanie zapisane: {filename}")
+
+
+def copy_config(source, destination):
+    shutil.copy(source, destination)
+    print(f"Konfiguracja zapisana: {destination}")
+
 
 def save_data():
     if results:
-        os.makedirs('results', exist_ok=True)
-        os.makedirs('data/summaries', exist_ok=True)
-        os.makedirs('data/configs', exist_ok=True)
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        os.makedirs(os.path.join(DATA_DIR, 'summaries'), exist_ok=True)
+        os.makedirs(os.path.join(DATA_DIR, 'configs'), exist_ok=True)
 
         timestamp = exp_info['timestamp_start']
         participant_id = exp_info['ID badanego']
 
-        filename_csv = f"results/result_{participant_id}_{timestamp}.csv"
-        with open(filename_csv, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=results[0].keys(), delimiter=';')
-            writer.writeheader()
-            writer.writerows(results)
-        print(f"Wyniki zapisane: {filename_csv}")
+        # magazyn wynikow tej sesji nie jest juz zmieniany - watek zapisu
+        # dostaje go bez kopiowania; podsumowanie skladane jest tutaj
+        filename_csv = os.path.join(RESULTS_DIR, f"result_{participant_id}_{timestamp}.csv")
+        writer.submit(write_csv, filename_csv, results, description=filename_csv)
+        if CFG['columnar_format'] in COLUMNAR_FORMATS:
+            metadata = json.dumps(session_metadata(), ensure_ascii=False, default=str)
+            writer.submit(save_columnar, filename_csv[:-len('.csv')], results,
+                          CFG['columnar_format'], metadata, description='plik kolumnowy')
+        writer.submit(register_result, participant_id, timestamp, filename_csv, description='rejestr')
 
         if config_is_custom:
-            config_filename = f"data/configs/config_{participant_id}_{timestamp}.ini"
-            shutil.copy(config_file, config_filename)
-            print(f"Konfiguracja zapisana: {config_filename}")
+            config_filename = os.path.join(DATA_DIR, 'configs', f"config_{participant_id}_{timestamp}.ini")
+            writer.submit(copy_config, config_file, config_filename, description=config_filename)
         else:
             print(f"Konfiguracja standardowa — pomijam zapis: {config_file}")
 
-        summary_filename = f"data/summaries/summary_{participant_id}_{timestamp}.txt"
-
-        experimental_trials = [r for r in results if r['czy_trening'] == 0]
-        correct_trials = [r for r in experimental_trials if r['czy_poprawna'] == 1]
-
-        if experimental_trials:
-            accuracy = len(correct_trials) / len(experimental_trials) * 100
-            rts = [r['czas_reakcji_ms'] for r in correct_trials if r['czas_reakcji_ms'] != '']
-            mean_rt = sum(rts) / len(rts) if rts else 0
-        else:
-            accuracy = 0
-            mean_rt = 0
-
-        with open(summary_filename, 'w', encoding='utf-8') as f:
-            f.write("=" * 60 + "\n")
-            f.write("PODSUMOWANIE SESJI EKSPERYMENTALNEJ\n")
-            f.write("=" * 60 + "\n\n")
-            f.write(f"ID badanego: {exp_info['ID badanego']}\n")
-            f.write(f"Data: {exp_info['data']}\n")
-            f.write(f"Czas rozpoczęcia: {exp_info['czas_rozpoczecia']}\n")
-            f.write(f"Czas zakończenia: {datetime.now().strftime('%H:%M:%S')}\n")
-            f.write(f"Plik konfiguracji: {config_file}\n")
-            f.write(f"Nazwa konfiguracji: {CFG['nazwa']}\n")
-            f.write(f"Wersja: {CFG['wersja']}\n\n")
-            f.write("-" * 60 + "\n")
-            f.write("DANE DEMOGRAFICZNE\n")
-            f.write("-" * 60 + "\n")
-            f.write(f"Wiek: {exp_info.get('Wiek', '')}\n")
-            f.write(f"Płeć: {exp_info.get('Płeć', '')}\n")
-            f.write(f"System telefonu: {exp_info.get('System telefonu', '')}\n")
-            f.write(f"Ręczność: {exp_info.get('Ręczność', '')}\n")
-            f.write(f"Korekta wzroku: {exp_info.get('Korekta wzroku', '')}\n")
-            f.write(f"Uwagi: {exp_info.get('Uwagi', '')}\n\n")
-            f.write("-" * 60 + "\n")
-            f.write("WYNIKI OGÓLNE\n")
-            f.write("-" * 60 + "\n")
-            f.write(f"Liczba prób treningowych: {CFG['n_training_trials']}\n")
-            f.write(f"Liczba prób eksperymentalnych: {len(experimental_trials)}\n")
-            f.write(f"Poprawność ogólna: {accuracy:.1f}%\n")
-            f.write(f"Średni czas reakcji (poprawne): {mean_rt:.1f} ms\n\n")
+        if stimulus_pool:
+            print(f"Pula bodźców: {stimulus_pool.report()}")
+
+        summary_filename = os.path.join(DATA_DIR, 'summaries', f"summary_{participant_id}_{timestamp}.txt")
+
+        f = io.StringIO()
+        f.write("=" * 60 + "\n")
+        f.write("PODSUMOWANIE SESJI EKSPERYMENTALNEJ\n")
+        f.write("=" * 60 + "\n\n")
+        f.write(f"ID badanego: {exp_info['ID badanego']}\n")
+        f.write(f"Data: {exp_info['data']}\n")
+        f.write(f"Czas rozpoczęcia: {exp_info['czas_rozpoczecia']}\n")
+        f.write(f"Czas zakończenia: {datetime.now().strftime('%H:%M:%S')}\n")
+        f.write(f"Plik konfiguracji: {config_file}\n")
+        f.write(f"Nazwa konfiguracji: {CFG['nazwa']}\n")
+        f.write(f"Wersja: {CFG['wersja']}\n\n")
+        f.write("-" * 60 + "\n")
+        f.write("DANE DEMOGRAFICZNE\n")
+        f.write("-" * 60 + "\n")
+        f.write(f"Wiek: {exp_info.get('Wiek', '')}\n")
+        f.write(f"Płeć: {exp_info.get('Płeć', '')}\n")
+        f.write(f"System telefonu: {exp_info.get('System telefonu', '')}\n")
+        f.write(f"Ręczność: {exp_info.get('Ręczność', '')}\n")
+        f.write(f"Korekta wzroku: {exp_info.get('Korekta wzroku', '')}\n")
+        f.write(f"Uwagi: {exp_info.get('Uwagi', '')}\n\n")
+        f.write("-" * 60 + "\n")
+        f.write("WYNIKI OGÓLNE\n")
+        f.write("-" * 60 + "\n")
+        f.write(f"Liczba prób treningowych: {CFG['n_training_trials']}\n")
+        f.write(f"Liczba prób eksperymentalnych: {stats.total.n}\n")
+        f.write(f"Poprawność ogólna: {stats.total.accuracy:.1f}%\n")
+        f.write(f"Średni czas reakcji (poprawne): {stats.total.mean_rt:.1f} ms "
+                f"(SD {stats.total.sd_rt:.1f})\n\n")
+        f.write("-" * 60 + "\n")
+        f.write("WYNIKI WG WARUNKÓW\n")
+        f.write("-" * 60 + "\n")
+        for load_cond, load_label in [('LL', 'Niskie obciążenie'), ('HL', 'Wysokie obciążenie')]:
+            for icon_cat, icon_label in [('social', 'Social media'), ('neutral', 'Neutralna')]:
+                cond = stats.condition(load_cond, icon_cat)
+                f.write(f"[{load_cond} + {icon_label}]: n={cond.n}, "
+                        f"poprawność={cond.accuracy:.1f}%, śr. RT={cond.mean_rt:.1f} ms "
+                        f"(SD {cond.sd_rt:.1f})\n")
+        f.write("\n")
+        f.write("-" * 60 + "\n")
+        f.write("WYNIKI WG BLOKÓW\n")
+        f.write("-" * 60 + "\n")
+        for block_num, block in sorted(stats.blocks.items()):
+            f.write(f"[Blok {block_num}]: n={block.n}, poprawność={block.accuracy:.1f}%, "
+                    f"śr. RT={block.mean_rt:.1f} ms (SD {block.sd_rt:.1f})\n")
+        f.write("\n")
+        f.write("-" * 60 + "\n")
+        f.write("PARAMETRY EKSPERYMENTU\n")
+        f.write("-" * 60 + "\n")
+        f.write(f"Czas fiksacji: {CFG['fixation_time'] * 1000:.0f} ms\n")
+        f.write(f"Czas ekspozycji bodźców: {CFG['stimulus_time'] * 1000:.0f} ms\n")
+        f.write(f"Maks. czas odpowiedzi: {CFG['max_response_time'] * 1000:.0f} ms\n")
+        if FRAME_RATE:
+            f.write(f"Odświeżanie ekranu: {FRAME_RATE:.2f} Hz (fazy liczone w klatkach: "
+                    + ", ".join(f"{k}={v}" for k, v in PHASE_FRAMES.items()) + ")\n")
+        f.write(f"Niskie obciążenie (LL): 3 kształty\n")
+        f.write(f"Wysokie obciążenie (HL): 6 kształtów\n")
+        f.write(f"Ikona w centrum: {'Tak' if CFG['icon_in_center'] else 'Nie'}\n")
+        f.write(f"Kolorowe kształty: {'Tak' if CFG['use_colors'] else 'Nie'}\n")
+        f.write(f"Unikalne kształty: {'Tak' if CFG['unique_shapes'] else 'Nie'}\n")
+        f.write(f"Pełny ekran: {'Tak' if CFG['fullscreen'] else 'Nie'}\n")
+        f.write(f"Klawisze: A={KEY_TRIANGLE}, L={KEY_DIAMOND}\n")
+        f.write(f"Odpowiedzi: backend {'keyboard' if KEYBOARD else 'event'}\n")
+        f.write(f"Tryb czasu rzeczywistego: {'Tak' if CFG['realtime'] else 'Nie'}\n")
+        f.write(f"Rysowanie planszy: {CFG['render_mode']}"
+                f"{' (składana z wyprzedzeniem)' if CFG['prerender'] else ''}\n")
+
+        if CALIBRATION:
+            f.write("\n")
             f.write("-" * 60 + "\n")
-            f.write("WYNIKI WG WARUNKÓW\n")
+            f.write("KALIBRACJA STANOWISKA\n")
             f.write("-" * 60 + "\n")
-            for load_cond, load_label in [('LL', 'Niskie obciążenie'), ('HL', 'Wysokie obciążenie')]:
-                for icon_cat, icon_label in [('social', 'Social media'), ('neutral', 'Neutralna')]:
-                    cond_trials = [r for r in experimental_trials
-                                   if r['load_condition'] == load_cond and r['icon_category'] == icon_cat]
-                    cond_correct = [r for r in cond_trials if r['czy_poprawna'] == 1]
-                    if cond_trials:
-                        cond_acc = len(cond_correct) / len(cond_trials) * 100
-                        cond_rts = [r['czas_reakcji_ms'] for r in cond_correct if r['czas_reakcji_ms'] != '']
-                        cond_mean_rt = sum(cond_rts) / len(cond_rts) if cond_rts else 0
-                    else:
-                        cond_acc = 0
-                        cond_mean_rt = 0
-                    f.write(f"[{load_cond} + {icon_label}]: n={len(cond_trials)}, "
-                            f"poprawność={cond_acc:.1f}%, śr. RT={cond_mean_rt:.1f} ms\n")
+            for line in calibration_lines(CALIBRATION):
+                f.write(line + "\n")
+
+        if CFG['instrumentacja']:
             f.write("\n")
             f.write("-" * 60 + "\n")
-            f.write("PARAMETRY EKSPERYMENTU\n")
+            f.write("POMIARY CZASU (odchylenie od czasu nominalnego)\n")
             f.write("-" * 60 + "\n")
-            f.write(f"Czas fiksacji: {CFG['fixation_time'] * 1000:.0f} ms\n")
-            f.write(f"Czas ekspozycji bodźców: {CFG['stimulus_time'] * 1000:.0f} ms\n")
-            f.write(f"Maks. czas odpowiedzi: {CFG['max_response_time'] * 1000:.0f} ms\n")
-            f.write(f"Niskie obciążenie (LL): 3 kształty\n")
-            f.write(f"Wysokie obciążenie (HL): 6 kształtów\n")
-            f.write(f"Ikona w centrum: {'Tak' if CFG['icon_in_center'] else 'Nie'}\n")
-            f.write(f"Kolorowe kształty: {'Tak' if CFG['use_colors'] else 'Nie'}\n")
-            f.write(f"Unikalne kształty: {'Tak' if CFG['unique_shapes'] else 'Nie'}\n")
-            f.write(f"Pełny ekran: {'Tak' if CFG['fullscreen'] else 'Nie'}\n")
-            f.write(f"Klawisze: A={KEY_TRIANGLE}, L={KEY_DIAMOND}\n")
+            for column, nominal_s, label in [
+                    ('bodziec_zmierzony_ms', CFG['stimulus_time'], 'Ekspozycja bodźców'),
+                    ('fiksacja_zmierzona_ms', CFG['fixation_time'], 'Fiksacja'),
+                    ('pusty_zmierzony_ms', BLANK_TIME, 'Pusty ekran')]:
+                for line in jitter_histogram(results, column, nominal_s * 1000, label):
+                    f.write(line + "\n")
+                f.write("\n")
+
+        writer.submit(write_text, summary_filename, f.getvalue(), description=summary_filename)
 
-        print(f"Podsumowanie zapisane: {summary_filename}")
+    writer.submit(journal.close, description='dziennik')
 
 
 def save_and_quit():
     save_data()
     win.close()
+    writer.close()
     core.quit()
 
 
 # ==================== INSTRUKCJE ====================
-def show_instruction(text, wait_for_space=True):
-    instr = visual.TextStim(win, text=text, height=0.035, color='white', wrapWidth=1.5)
-    instr.draw()
+# Kazdy rozny tekst plansz jest skladany (layout + rasteryzacja glifow) raz;
+# na planszach bloku i przerwy zmienia sie tylko krotki naglowek z numerem
+# bloku, rysowany osobnym TextStim nad stala czescia.
+INSTRUCTION_HEIGHT = 0.035
+instruction_cache = {}
+instruction_header = None
+
+
+def get_instruction_stim(text, pos=(0, 0)):
+    key = (text, pos)
+    if key not in instruction_cache:
+        instruction_cache[key] = visual.TextStim(win, text=text, height=INSTRUCTION_HEIGHT,
+                                                 color='white', wrapWidth=1.5, pos=pos)
+    return instruction_cache[key]
+
+
+def prerender_instructions(texts, header_sample):
+    """Sklada i raz rysuje (poza ekranem) wszystkie stale plansze i naglowek przed sesja."""
+    global instruction_header
+    if HEADLESS:
+        return
+    for text, pos in texts:
+        get_instruction_stim(text, pos).draw()
+    instruction_header = visual.TextStim(win, text=header_sample, height=INSTRUCTION_HEIGHT,
+                                         color='white', wrapWidth=1.5, pos=HEADER_POS)
+    instruction_header.draw()
+    win.clearBuffer()
+
+
+def show_instruction(text, wait_for_space=True, header=None):
+    """Plansza z tekstem; `header` to zmienna czesc (np. numer bloku) nad tekstem."""
+    if HEADLESS:
+        return
+    if header is None:
+        get_instruction_stim(text).draw()
+    else:
+        if instruction_header.text != header:
+            instruction_header.text = header
+        instruction_header.draw()
+        get_instruction_stim(text, BODY_POS).draw()
     win.flip()
 
     if wait_for_space:
@@ -818,10 +2412,9 @@ na ekranie obiekt, którym będzie trójkąt lub romb.
 
 Naciśnij spację, żeby kontynuować."""
 
-show_instruction(instruction_1)
-
-if CFG['wersja'] == 'A':
-    instruction_2 = """Przez cały czas trwania badania skupiaj wzrok na znaku "+" 
+# inna wersja niz 'A' - teksty wersji B, jak mapowanie klawiszy
+INSTRUCTION_2 = {
+    'A': """Przez cały czas trwania badania skupiaj wzrok na znaku "+" 
 wyświetlanym w centralnej części ekranu.
 
 Podczas eksperymentu w krótkim czasie wyświetlane będą plansze z figurami.
@@ -840,9 +2433,8 @@ Pamiętaj, to bardzo ważne dla pomyślnego przebiegu badania.
 
 Po każdej odpowiedzi otrzymasz informację o jej poprawności.
 
-Naciśnij spację żeby kontynuować."""
-else:
-    instruction_2 = """Przez cały czas trwania badania skupiaj wzrok na znaku "+" 
+Naciśnij spację żeby kontynuować.""",
+    'B': """Przez cały czas trwania badania skupiaj wzrok na znaku "+" 
 wyświetlanym w centralnej części ekranu.
 
 Podczas eksperymentu w krótkim czasie wyświetlane będą plansze z figurami.
@@ -861,12 +2453,12 @@ Pamiętaj, to bardzo ważne dla pomyślnego przebiegu badania.
 
 Po każdej odpowiedzi otrzymasz informację o jej poprawności.
 
-Naciśnij spację żeby kontynuować."""
-
-show_instruction(instruction_2)
+Naciśnij spację żeby kontynuować.""",
+}
+instruction_2 = INSTRUCTION_2.get(CFG['wersja'], INSTRUCTION_2['B'])
 
-if CFG['wersja'] == 'A':
-    instruction_3 = f"""Badanie jest podzielone na 4 bloki (warunki): 
+INSTRUCTION_3 = {
+    'A': f"""Badanie jest podzielone na 4 bloki (warunki): 
 po każdym z nich, będziesz miał/a chwilę przerwy.
 
 Pamiętaj:
@@ -878,9 +2470,8 @@ Po naciśnięciu klawisza odpowiedzi, wciśnij spację aby przejść do kolejnej
 Na początku rozpoczniesz sesję treningową, 
 żeby nauczyć się wykonywać badanie.
 
-Kliknij spację, aby rozpocząć sesję treningową."""
-else:
-    instruction_3 = f"""Badanie jest podzielone na 4 bloki (warunki): 
+Kliknij spację, aby rozpocząć sesję treningową.""",
+    'B': f"""Badanie jest podzielone na 4 bloki (warunki): 
 po każdym z nich, będziesz miał/a chwilę przerwy.
 
 Pamiętaj:
@@ -893,20 +2484,12 @@ Po naciśnięciu klawisza odpowiedzi, wciśnij spację aby przejść do kolejnej
 Na początku rozpoczniesz sesję treningową, 
 żeby nauczyć się wykonywać badanie.
 
-Kliknij spację, aby rozpocząć sesję treningową."""
-
-show_instruction(instruction_3)
-
-# ==================== TRENING ====================
-trial_list_training = create_training_list()
+Kliknij spację, aby rozpocząć sesję treningową.""",
+}
+instruction_3 = INSTRUCTION_3.get(CFG['wersja'], INSTRUCTION_3['B'])
 
-for i, trial_params in enumerate(trial_list_training):
-    result = run_trial(trial_params, i + 1, block_number=0, is_practice=True)
-    if result:
-        results.append(result)
-
-if CFG['wersja'] == 'A':
-    instruction_after_training = f"""Koniec sesji treningowej!
+INSTRUCTION_AFTER_TRAINING = {
+    'A': f"""Koniec sesji treningowej!
 
 Teraz rozpocznie się właściwy eksperyment.
 Składa się on z {CFG['n_blocks']} bloków po {CFG['trials_per_block']} prób każdy.
@@ -917,9 +2500,8 @@ Pamiętaj:
 - klawisz A (lewa ręka) = TRÓJKĄT
 - klawisz L (prawa ręka) = ROMB
 
-Naciśnij spację aby rozpocząć eksperyment"""
-else:
-    instruction_after_training = f"""Koniec sesji treningowej!
+Naciśnij spację aby rozpocząć eksperyment""",
+    'B': f"""Koniec sesji treningowej!
 
 Teraz rozpocznie się właściwy eksperyment.
 Składa się on z {CFG['n_blocks']} bloków po {CFG['trials_per_block']} prób każdy.
@@ -930,41 +2512,155 @@ Pamiętaj:
 - klawisz L (prawa ręka) = TRÓJKĄT
 - klawisz A (lewa ręka) = ROMB
 
-Naciśnij spację aby rozpocząć eksperyment"""
+Naciśnij spację aby rozpocząć eksperyment""",
+}
+instruction_after_training = INSTRUCTION_AFTER_TRAINING.get(CFG['wersja'], INSTRUCTION_AFTER_TRAINING['B'])
+
+
+# plansze bloku/przerwy: zmienny naglowek + stala tresc pod nim
+HEADER_POS = (0, 0.08)
+BODY_POS = (0, -0.06)
+BLOCK_START_TEXT = "Naciśnij spację aby rozpocząć"
+BREAK_TEXT = ("Możesz chwilę odpocząć.\n\n"
+              "Naciśnij spację gdy będziesz gotowy/a")
+RESUME_TEXT = ("Sesja została wznowiona.\n\n"
+               "Badanie będzie kontynuowane od miejsca, w którym zostało przerwane.\n\n"
+               "Naciśnij spację, żeby kontynuować.")
+CALIBRATION_REFUSED_TEXT = ("Stanowisko nie spełnia wymagań czasowych badania - sesja nie zostanie rozpoczęta.\n"
+                            "Naciśnij spację, żeby zakończyć.")
+END_TEXT = "Koniec eksperymentu!\n\nDziękujemy za udział w badaniu.\n\nNaciśnij spację aby zakończyć"
+
+prerender_instructions([
+    (instruction_1, (0, 0)),
+    (instruction_2, (0, 0)),
+    (instruction_3, (0, 0)),
+    (instruction_after_training, (0, 0)),
+    (END_TEXT, (0, 0)),
+    (BLOCK_START_TEXT, BODY_POS),
+    (BREAK_TEXT, BODY_POS),
+], header_sample=f"BLOK 1 z {CFG['n_blocks']}")
+
+
+def refuse_session(problems):
+    """Stanowisko nie zapewnia czasow z konfiguracji - sesja nie startuje.
+    Dziennik zostaje bez linii koniec: przerwana sesja (takze wznawiana)
+    pozostaje do wznowienia na sprawnym stanowisku."""
+    journal.write({'typ': 'odmowa', 'problemy': problems})
+    journal.close(finished=False)
+    show_instruction(CALIBRATION_REFUSED_TEXT + "\n\n" + "\n".join(problems))
+    win.close()
+    writer.close()
+    core.quit()
+
 
-show_instruction(instruction_after_training)
+def run_session():
+    global PLAN, CALIBRATION, journal
 
-# ==================== WŁAŚCIWY EKSPERYMENT ====================
-# 320 prob losowo przemieszanych, kazdy z 4 warunkow dokladnie 80 razy.
-all_trials = create_trial_list()
-n_blocks = CFG['n_blocks']
-trials_per_block = len(all_trials) // n_blocks
+    # Dziennik otwierany dopiero tutaj - po utworzeniu okna i sprawdzeniu
+    # ikon - zeby nieudany start nie zostawil naglowka sesji do "wznowienia".
+    journal = SessionJournal(*journal_target)
 
-for block_idx in range(n_blocks):
-    block_num = block_idx + 1
-    block_trials = all_trials[block_idx * trials_per_block : (block_idx + 1) * trials_per_block]
+    # Caly plan sesji z ziarna - przy wznowieniu powstaje ten sam plan,
+    # a proby juz zapisane w dzienniku sa pomijane.
+    PLAN = compile_session_plan(CFG, SESSION_SEED)
+    training_rows = np.flatnonzero(PLAN['czy_trening'] == 1)
+    experimental_rows = np.flatnonzero(PLAN['czy_trening'] == 0)
 
-    show_instruction(
-        f"BLOK {block_num} z {n_blocks}\n\n"
-        f"Naciśnij spację aby rozpocząć"
-    )
+    results.reserve(len(PLAN['numer_proby']))
+    n_done_training = int((results.column('czy_trening') == 1).sum()) if len(results) else 0
+    n_done_experimental = len(results) - n_done_training
+
+    if CFG['calibration'] and not HEADLESS:
+        CALIBRATION = calibrate()
+        print("Kalibracja stanowiska:")
+        for line in calibration_lines(CALIBRATION):
+            print(f"  {line}")
+        if CALIBRATION['problemy'] and CFG['calibration_refuse']:
+            refuse_session(CALIBRATION['problemy'])
+
+    # plan zapisywany dopiero po kalibracji - odmowa nie zostawia pliku planu
+    save_plan(PLAN)
+
+    if resumed:
+        show_instruction(RESUME_TEXT)
+    else:
+        show_instruction(instruction_1)
+
+    show_instruction(instruction_2)
 
-    for i, trial_params in enumerate(block_trials):
-        trial_num = block_idx * trials_per_block + i + 1
-        result = run_trial(trial_params, trial_num, block_number=block_num, is_practice=False)
+    if n_done_experimental == 0 and n_done_training < len(training_rows):
+        show_instruction(instruction_3)
+
+    # ==================== TRENING ====================
+    for i, row in enumerate(training_rows):
+        if i < n_done_training:
+            continue
+        result = run_trial(row, next_row=row + 1)
         if result:
-            results.append(result)
+            record_result(result)
+
+    if n_done_experimental == 0:
+        show_instruction(instruction_after_training)
+
+    # ==================== WŁAŚCIWY EKSPERYMENT ====================
+    # 320 prob losowo przemieszanych, kazdy z 4 warunkow dokladnie 80 razy.
+    n_blocks = CFG['n_blocks']
+    trials_per_block = len(experimental_rows) // n_blocks
 
-    if block_idx < n_blocks - 1:
-        show_instruction(
-            f"Przerwa!\n\n"
-            f"Ukończono blok {block_num} z {n_blocks}.\n\n"
-            f"Możesz chwilę odpocząć.\n\n"
-            f"Naciśnij spację gdy będziesz gotowy/a"
-        )
+    for block_idx in range(n_blocks):
+        block_num = block_idx + 1
+        block_rows = experimental_rows[block_idx * trials_per_block : (block_idx + 1) * trials_per_block]
+
+        if (block_idx + 1) * trials_per_block <= n_done_experimental:
+            continue  # blok ukonczony przed przerwaniem sesji
+
+        show_instruction(BLOCK_START_TEXT, header=f"BLOK {block_num} z {n_blocks}")
+
+        for i, row in enumerate(block_rows):
+            trial_num = block_idx * trials_per_block + i + 1
+            if trial_num <= n_done_experimental:
+                continue
+            result = run_trial(row, next_row=row + 1)
+            if result:
+                record_result(result)
 
-show_instruction("Koniec eksperymentu!\n\nDziękujemy za udział w badaniu.\n\nNaciśnij spację aby zakończyć")
+        if block_idx < n_blocks - 1:
+            if not HEADLESS:
+                print(stats.block_report(block_num))
+            header = f"Przerwa!\n\nUkończono blok {block_num} z {n_blocks}."
+            if CFG['stats_on_break']:
+                block = stats.block(block_num)
+                header += f"\nPoprawność: {block.accuracy:.0f}%, śr. RT: {block.mean_rt:.0f} ms"
+            show_instruction(BREAK_TEXT, header=header)
 
-save_data()
-win.close()
-core.quit()
+    show_instruction(END_TEXT)
+
+    save_data()
+
+
+# ==================== SYMULACJA (--headless) ====================
+def run_simulation(n_sessions, first_seed=None):
+    """Pelna sciezka plan -> run_trial -> save_data dla n symulowanych badanych."""
+    global sim_rng
+    n_trials = 0
+    t_start = time.perf_counter()
+    for k in range(n_sessions):
+        seed = first_seed + k if first_seed is not None else None
+        start_session(simulated_exp_info(f"SYM{SIM_BATCH}_{k + 1:04d}"), seed)
+        sim_rng = np.random.default_rng(SESSION_SEED)
+        run_session()
+        n_trials += len(results)
+    writer.flush()
+    elapsed = time.perf_counter() - t_start
+    print(f"Symulacja: {n_sessions} sesji, {n_trials} prób w {elapsed:.2f} s "
+          f"({n_sessions / elapsed:.1f} sesji/s, {n_trials / elapsed:.0f} prób/s)")
+
+
+if HEADLESS:
+    run_simulation(ARGS.sesje, ARGS.seed)
+    writer.close()
+else:
+    run_session()
+    win.close()
+    writer.close()
+    core.quit()